@@ -1,19 +1,71 @@
+import asyncio
+from datetime import datetime
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    status,
+)
 from sse_starlette import EventSourceResponse
 
 from app.db.main import CurrentUser, SessionDep
-from app.models.db_models.chat import ChatCreate, MessageCreate, MessageInfo
+from app.db.postgres_client import async_session_maker
+from app.middleware.rate_limit import chat_message_rate_limit
+from app.models.db_models.chat import ChatCreate, MessageInfo
 from app.models.request.chat import TitleUpdateBody, UserQueryBody
 from app.models.response import ResponseBase
 from app.models.response.chat import ChatInfoItem, TitleUpdateItem
 from app.services import chat_service
+from app.services.generation_stream import (
+    get_generation_owner,
+    start_generation,
+    stream_generation,
+)
+from app.services.reply_writer import StreamedReplyWriter
+from app.utils.json_response import FastJSONResponse, build_response_body
 from app.utils.logger import logger
-from app.utils.model import generate_chat_title, generate_model_response_stream
+from app.utils.model import generate_chat_title
+from app.utils.pagination import decode_cursor, encode_cursor
 
 router = APIRouter(tags=["chat"])
 
+# strong references to fire-and-forget tasks, so they are not collected
+running_tasks: set[asyncio.Task] = set()
+
+
+async def generate_and_save_chat_title(
+    *, chat_id: UUID, user_query: str
+) -> str | None:
+    """
+    Generates a title for a new chat and stores it, off the first-token path.
+
+    Runs concurrently with the answer stream on its own database session. A
+    failure is logged and only means the chat keeps its default title.
+
+    Args:
+        chat_id (UUID): The chat to name.
+        user_query (str): The first message of the chat.
+
+    Returns:
+        str | None: The new title, or None if it could not be generated.
+    """
+    try:
+        title = await generate_chat_title(user_query)
+        async with async_session_maker() as session:
+            await chat_service.update_chat_title_by_chat_id(
+                session=session, chat_id=chat_id, new_title=title
+            )
+    except Exception as e:
+        logger.error(f"Failed to generate chat title:{e}")
+        return None
+    logger.success(f"Chat title generated successfully:{title}")
+    return title
+
 
 @router.post("/chat", summary="Create a new chat")
 async def create_new_chat(
@@ -37,7 +89,7 @@ async def create_new_chat(
         The new chat will be initialized with a default title of "New Chat".
     """
     try:
-        chat_info = chat_service.create_new_chat(
+        chat_info = await chat_service.create_new_chat(
             session=session,
             new_chat_info=ChatCreate(
                 owner_id=current_user.id, title="New Chat"
@@ -52,68 +104,67 @@ async def create_new_chat(
     return ResponseBase[ChatInfoItem](data=chat_info)
 
 
-@router.post(
-    "/chat/messages",
-    summary="Add messages",
-)
-async def add_message(
+@router.delete("/chat/{chat_id}", summary="Delete a chat")
+async def delete_chat(
     session: SessionDep,
     current_user: CurrentUser,
-    user_query_body: UserQueryBody,
-    background_tasks: BackgroundTasks,
-):
+    chat_id: UUID,
+) -> ResponseBase:
+    """
+    Deletes a chat of the current user.
+
+    Args:
+        session (SessionDep): Database session dependency.
+        current_user (CurrentUser): Authenticated current user.
+        chat_id (UUID): The chat to delete.
+
+    Returns:
+        ResponseBase: An empty response once the chat is deleted.
+
+    Raises:
+        HTTPException:
+            - 404 if the chat does not exist, is already deleted or belongs to another user
+            - 500 if the chat cannot be deleted
+
+    Notes:
+        The chat is only marked as deleted, which is instant whatever its length.
+        Its messages are removed in the background by the chat purger.
+    """
     try:
-        db_chat = chat_service.get_chat_by_chat_id(
-            session=session, chat_id=user_query_body.chat_id
+        deleted = await chat_service.delete_chat(
+            session=session, chat_id=chat_id, owner_id=current_user.id
         )
     except Exception as e:
-        logger.error(f"Failed to get chat by chat_id: {e}")
+        logger.error(f"Failed to delete the chat:\n{e}")
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat not found",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete the chat",
         )
-
-    if db_chat.owner_id != current_user.id:
+    if not deleted:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission"
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
         )
+    return ResponseBase()
 
-    # If this is the first conversation, generate a title
-    if (
-        chat_service.count_chat_messages(
-            session=session, chat_id=user_query_body.chat_id
-        )
-        == 0
-    ):
-        try:
-            title = await generate_chat_title(user_query_body.content)
-            chat_service.update_chat_title_by_chat_id(
-                session=session,
-                chat_id=user_query_body.chat_id,
-                new_title=title,
-            )
-            logger.success(f"Chat title generated successfully:{title}")
-        except Exception as e:
-            logger.error(f"Failed to generate chat title:{e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate chat title",
-            )
 
-    # add the user message to the chat
+@router.post(
+    "/chat/messages",
+    summary="Add messages",
+    dependencies=[Depends(chat_message_rate_limit)],
+)
+async def add_message(
+    session: SessionDep,
+    current_user: CurrentUser,
+    user_query_body: UserQueryBody,
+):
+    # check ownership, store the message and its reply, read the history
     try:
-        chat_service.add_message_to_chat(
+        chat_turn = await chat_service.start_chat_turn(
             session=session,
-            new_message=MessageCreate(
-                chat_id=user_query_body.chat_id,
-                role=user_query_body.role,
-                content=user_query_body.content,
-                sequence=0,
-            ),
-        )
-        # retrieve all messages from the chat
-        messages: list[MessageInfo] = chat_service.get_messages_from_chat(
-            session=session, chat_id=user_query_body.chat_id
+            chat_id=user_query_body.chat_id,
+            owner_id=current_user.id,
+            role=user_query_body.role,
+            content=user_query_body.content,
         )
     except Exception as e:
         logger.error(f"Failed to add messages: {e}")
@@ -121,57 +172,150 @@ async def add_message(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to add messages",
         )
+    if chat_turn is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+        )
 
-    async def stream_and_save():
-        full_content = ""
+    # If this is the first conversation, generate a title next to the answer
+    title_task = None
+    if chat_turn.is_first:
+        title_task = asyncio.create_task(
+            generate_and_save_chat_title(
+                chat_id=user_query_body.chat_id,
+                user_query=user_query_body.content,
+            )
+        )
+        running_tasks.add(title_task)
+        title_task.add_done_callback(running_tasks.discard)
 
-        async for chunk in generate_model_response_stream(messages):
-            full_content += chunk
-            yield chunk
+    # the reply already took its place in the chat
+    reply_writer = StreamedReplyWriter(chat_turn.reply_id)
 
-        background_tasks.add_task(
-            chat_service.add_message_to_chat,
-            session=session,
-            new_message=MessageCreate(
-                chat_id=user_query_body.chat_id,
-                role="assistant",
-                content=full_content,
-                sequence=0,
-            ),
+    # generated in the background, the response only follows the generation
+    generation_id = await start_generation(
+        owner_id=current_user.id,
+        chat_id=user_query_body.chat_id,
+        messages=chat_turn.history,
+        reply_writer=reply_writer,
+        title_task=title_task,
+    )
+
+    async def stream_reply():
+        # the ID to resume from `/chat/generations/{id}` after a disconnect
+        yield {"event": "generation", "data": generation_id}
+        async for event in stream_generation(generation_id):
+            yield event
+
+    return EventSourceResponse(
+        stream_reply(),
+        ping=15,
+        headers={"Cache-Control": "no-cache", "X-Generation-Id": generation_id},
+    )
+
+
+@router.get("/chat/generations/{generation_id}", summary="Resume a reply")
+async def resume_generation(
+    current_user: CurrentUser,
+    generation_id: str,
+    last_event_id: Annotated[int, Header()] = 0,
+):
+    """
+    Resumes following a reply generated by `POST /chat/messages`.
+
+    Replays the events after `Last-Event-ID`, then follows the live reply
+    until it is finished, without generating it again. Several clients may
+    follow one generation at once.
+
+    Args:
+        current_user (CurrentUser): Authenticated current user.
+        generation_id (str): The ID sent in the `generation` event and the
+            `X-Generation-Id` header.
+        last_event_id (int): The `Last-Event-ID` header the browser sends when
+            reconnecting, 0 to replay the reply from its start.
+
+    Returns:
+        EventSourceResponse: The missed events, then the live ones.
+
+    Raises:
+        HTTPException:
+            - 404 if the generation does not exist, expired or belongs to another user
+
+    Notes:
+        A finished generation can be replayed for GENERATION_STREAM_TTL
+        seconds, afterwards the reply is read from `/chat/messages`.
+    """
+    try:
+        owner_id = await get_generation_owner(generation_id)
+    except Exception as e:
+        logger.error(f"Failed to get the generation: {e}")
+        owner_id = None
+    # a generation of another user is not found either, so its ID leaks nothing
+    if owner_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Generation not found",
         )
 
     return EventSourceResponse(
-        stream_and_save(),
+        stream_generation(generation_id, last_event_id=last_event_id),
         ping=15,
         headers={"Cache-Control": "no-cache"},
     )
 
 
-@router.get("/chat/messages")
+@router.get("/chat/messages", response_model=ResponseBase[list[MessageInfo]])
 async def get_chat_messages(
     session: SessionDep,
     current_user: CurrentUser,
     chat_id: UUID,
-):
+    before: str | None = None,
+    after: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+) -> FastJSONResponse:
+    """
+    Returns one page of a chat history, newest message first.
+
+    Args:
+        session (SessionDep): Database session dependency.
+        current_user (CurrentUser): Authenticated current user.
+        chat_id (UUID): The chat to read.
+        before (str | None): Cursor, only return messages older than it.
+        after (str | None): Cursor, only return messages newer than it.
+        limit (int): Page size, between 1 and 200.
+
+    Returns:
+        ResponseBase[list[MessageInfo]]: The page of messages. `next_cursor` is
+            set when more messages exist; pass it back as `before` (or as `after`
+            when paging forward with `after`) to fetch the next page.
+
+    Raises:
+        HTTPException:
+            - 400 if a cursor is invalid
+            - 404 if the chat does not exist or belongs to another user
+            - 500 if the messages cannot be read
+    """
     try:
-        db_chat = chat_service.get_chat_by_chat_id(
-            session=session, chat_id=chat_id
+        before_sequence = (
+            int(decode_cursor(before)["sequence"]) if before else None
         )
-    except Exception as e:
-        logger.error(f"Failed to get chat by chat_id: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat not found",
+        after_sequence = (
+            int(decode_cursor(after)["sequence"]) if after else None
         )
-
-    if db_chat.owner_id != current_user.id:
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Invalid message cursor: {e}")
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission"
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
         )
 
     try:
-        messages = chat_service.get_messages_from_chat(
-            session=session, chat_id=chat_id
+        page = await chat_service.get_message_page_from_chat(
+            session=session,
+            chat_id=chat_id,
+            owner_id=current_user.id,
+            before=before_sequence,
+            after=after_sequence,
+            limit=limit,
         )
     except Exception as e:
         logger.error(f"Failed to get the messages: {e}")
@@ -179,19 +323,71 @@ async def get_chat_messages(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get the messages",
         )
-    return ResponseBase[list[MessageInfo]](data=messages)
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+        )
+    messages, has_more = page
 
+    next_cursor = None
+    if has_more and messages:
+        # paging forward continues from the newest message of the page
+        edge = messages[0] if after_sequence is not None else messages[-1]
+        next_cursor = encode_cursor({"sequence": edge["sequence"]})
+    return FastJSONResponse(
+        build_response_body(messages, next_cursor=next_cursor)
+    )
 
-@router.get("/chats")
+
+@router.get("/chats", response_model=ResponseBase[list[ChatInfoItem]])
 async def get_user_chats(
     session: SessionDep,
     current_user: CurrentUser,
-):
+    before: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+) -> FastJSONResponse:
+    """
+    Returns one page of the chats of the current user, most recently active first.
+
+    Args:
+        session (SessionDep): Database session dependency.
+        current_user (CurrentUser): Authenticated current user.
+        before (str | None): Cursor, only return chats less recently active than it.
+        limit (int): Page size, between 1 and 200.
+
+    Returns:
+        ResponseBase[list[ChatInfoItem]]: The page of chats, each with its message
+            count and a preview of its newest message. `next_cursor` is set when
+            more chats exist; pass it back as `before` to fetch the next page.
+
+    Raises:
+        HTTPException:
+            - 400 if the cursor is invalid
+            - 500 if the chats cannot be read
+    """
+    try:
+        position = decode_cursor(before) if before else None
+        before_position = (
+            (
+                datetime.fromisoformat(position["updated_at"]),
+                UUID(position["id"]),
+            )
+            if position
+            else None
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Invalid chat cursor: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
     try:
-        chat_infos = chat_service.get_chats_by_user_id(
-            session=session, user_id=current_user.id
+        chat_infos, has_more = await chat_service.get_chats_by_user_id(
+            session=session,
+            user_id=current_user.id,
+            before=before_position,
+            limit=limit,
         )
-        return ResponseBase[list[ChatInfoItem]](data=chat_infos)
     except Exception as e:
         logger.error(f"Failed to get conversation list: {e}")
         raise HTTPException(
@@ -199,6 +395,19 @@ async def get_user_chats(
             detail="Failed to get conversation list",
         )
 
+    next_cursor = None
+    if has_more and chat_infos:
+        edge = chat_infos[-1]
+        next_cursor = encode_cursor(
+            {
+                "updated_at": edge["updated_at"].isoformat(),
+                "id": str(edge["id"]),
+            }
+        )
+    return FastJSONResponse(
+        build_response_body(chat_infos, next_cursor=next_cursor)
+    )
+
 
 @router.post("/chat/title")
 async def update_chat_title(
@@ -207,26 +416,11 @@ async def update_chat_title(
     title_update_body: TitleUpdateBody,
 ):
     try:
-        db_chat = chat_service.get_chat_by_chat_id(
-            session=session, chat_id=title_update_body.chat_id
-        )
-    except Exception as e:
-        logger.error(f"Failed to get chat by chat_id: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat not found",
-        )
-
-    if db_chat.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission"
-        )
-
-    try:
-        new_db_chat = chat_service.update_chat_title_by_chat_id(
+        title_update = await chat_service.update_chat_title_by_chat_id(
             session=session,
             chat_id=title_update_body.chat_id,
             new_title=title_update_body.new_title,
+            owner_id=current_user.id,
         )
     except Exception as e:
         logger.error(f"Failed to update the title: {e}")
@@ -234,10 +428,8 @@ async def update_chat_title(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update the title",
         )
-    return ResponseBase[TitleUpdateItem](
-        data=TitleUpdateItem(
-            id=new_db_chat.id,
-            title=new_db_chat.title,
-            updated_at=new_db_chat.updated_at,
+    if title_update is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
         )
-    )
+    return ResponseBase[TitleUpdateItem](data=title_update)
@@ -0,0 +1,59 @@
+import secrets
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from app.core.config import settings
+from app.db.chat_cache import chat_cache_stats
+from app.db.postgres_client import get_postgres_pool_stats
+from app.db.redis_client import get_redis_pool_stats
+from app.db.user_cache import user_cache_stats
+from app.models.response import ResponseBase
+from app.utils.mail_queue import mail_stats
+from app.utils.model import model_cache_stats
+
+
+async def verify_internal_token(
+    x_internal_token: Annotated[str | None, Header()] = None,
+) -> None:
+    """
+    Admits requests carrying INTERNAL_STATS_TOKEN in `X-Internal-Token`.
+
+    Raises:
+        HTTPException: 404 if the endpoints are disabled or the token is
+            missing or wrong, so they cannot be told apart from absent ones.
+    """
+    token = settings.INTERNAL_STATS_TOKEN
+    if (
+        not token
+        or x_internal_token is None
+        or not secrets.compare_digest(x_internal_token.encode(), token.encode())
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+
+router = APIRouter(
+    tags=["internal"],
+    include_in_schema=False,
+    dependencies=[Depends(verify_internal_token)],
+)
+
+
+@router.get("/internal/stats", summary="Runtime statistics of this worker")
+async def get_internal_stats() -> ResponseBase[dict]:
+    """
+    Reports the cache counters and pool usage of the current worker process.
+
+    Returns:
+        ResponseBase[dict]: Counters keyed by subsystem.
+    """
+    return ResponseBase[dict](
+        data={
+            "chat_cache": chat_cache_stats.to_dict(),
+            "user_cache": user_cache_stats.to_dict(),
+            "redis_pool": get_redis_pool_stats(),
+            "postgres_pool": get_postgres_pool_stats(),
+            "mail": mail_stats.to_dict(),
+            "model_cache": model_cache_stats.to_dict(),
+        }
+    )
@@ -9,9 +9,12 @@ from app.models.request.user import UserRegisterBody
 from app.models.response import ResponseBase
 from app.models.response.user import TokenItem
 from app.services import user_service
-from app.utils import security
 from app.utils.logger import logger
-from app.utils.security import Captcha
+from app.utils.security import (
+    Captcha,
+    PasswordHasherBusyError,
+    password_hasher,
+)
 from app.utils.token import create_access_token
 
 router = APIRouter(tags=["user"])
@@ -37,20 +40,34 @@ async def login(
         ResponseBase[TokenItem]: Response containing the access token with type 'Bearer'.
 
     Raises:
-        HTTPException: If user authentication fails (400 status code).
+        HTTPException:
+            - 400 if user authentication fails
+            - 503 if the password hashing pool is saturated
 
     Notes:
         - Uses OAuth2 password flow for authentication.
+        - The password is verified off the event loop, and rehashed when the
+          configured bcrypt cost changed since it was stored.
         - Logs errors if user retrieval fails.
         - Generates JWT access token for authenticated users.
     """
     try:
-        user = user_service.get_user_by_username(
+        user = await user_service.authenticate_user(
             session=session,
             username=user_form.username,
+            password=user_form.password,
+        )
+    except PasswordHasherBusyError as e:
+        logger.error(f"Failed to verify the password:\n{e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please try again later",
         )
     except Exception as e:
         logger.error(f"Failed to obtain user information:\n{e}")
+        user = None
+
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect username or password",
@@ -99,18 +116,25 @@ async def register(
             - 400 if image verification code is invalid
             - 400 if username already exists
             - 500 if user creation fails
+            - 503 if the password hashing pool is saturated
     """
+    # Consume both verification codes atomically, in one round trip
+    email_captcha_ok, img_captcha_ok = await Captcha.verify_captchas(
+        [
+            (new_user.email, new_user.email_captcha_code),
+            (new_user.img_captcha_id, new_user.img_captcha_code),
+        ]
+    )
+
     # Verify email verification code
-    if not Captcha.verify_captcha(new_user.email, new_user.email_captcha_code):
+    if not email_captcha_ok:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Wrong email verification code",
         )
 
     # Verify image verification code
-    if not Captcha.verify_captcha(
-        new_user.img_captcha_id, new_user.img_captcha_code
-    ):
+    if not img_captcha_ok:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Wrong image verification code",
@@ -119,7 +143,7 @@ async def register(
     # Check if the username already exists
 
     try:
-        db_user = user_service.get_user_by_username(
+        db_user = await user_service.get_user_by_username(
             session=session, username=new_user.username
         )
         if db_user:
@@ -135,14 +159,20 @@ async def register(
 
     # Create a new user
     try:
-        user_service.create_new_user(
+        await user_service.create_new_user(
             session=session,
             new_user_info=UserCreate(
                 username=new_user.username,
                 email=new_user.email,
-                password_hash=security.get_password_hash(new_user.password),
+                password_hash=await password_hasher.hash(new_user.password),
             ),
         )
+    except PasswordHasherBusyError as e:
+        logger.error(f"Failed to hash the password:\n{e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please try again later",
+        )
     except Exception as e:
         logger.error(f"Failed to register new user:\n{e}")
         raise HTTPException(
@@ -32,12 +32,60 @@ class Settings(BaseSettings):
             path=self.POSTGRESQL_DB,
         )
 
+    @computed_field
+    @property
+    def POSTGRESQL_ASYNC_URI(self) -> PostgresDsn:
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            username=self.POSTGRESQL_USER,
+            password=self.POSTGRESQL_PASSWORD,
+            host=self.POSTGRESQL_SERVER,
+            port=self.POSTGRESQL_PORT,
+            path=self.POSTGRESQL_DB,
+        )
+
+    POSTGRESQL_POOL_SIZE: int = 10
+    POSTGRESQL_MAX_OVERFLOW: int = 20
+    POSTGRESQL_POOL_PRE_PING: bool = True
+    # seconds to wait for a free connection when the pool is exhausted
+    POSTGRESQL_POOL_TIMEOUT: float = 10.0
+    # connections older than this many seconds are replaced on checkout,
+    # before servers or proxies drop them
+    POSTGRESQL_POOL_RECYCLE: int = 1800
+    # checkouts waiting longer than this many seconds are logged
+    POSTGRESQL_POOL_WAIT_WARNING: float = 0.5
+    # apply pending migrations at boot instead of refusing to start, for
+    # development; deployments run `python -m app.db.maintenance migrate`
+    POSTGRESQL_AUTO_MIGRATE: bool = False
+
     # REDIS
     REDIS_HOST: str = "127.0.0.1"
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str = ""
     REDIS_DB: int = 0
     REDIS_EXPIRE: int = 600
+    # hot conversation cache: last N turns of each active chat
+    CHAT_CACHE_TURNS: int = 50
+    CHAT_CACHE_TTL: int = 3600
+    # streamed replies are checkpointed to Postgres once this many characters
+    # are buffered, or this many seconds after the previous checkpoint
+    CHAT_STREAM_FLUSH_CHARS: int = 1024
+    CHAT_STREAM_FLUSH_INTERVAL: float = 2.0
+    # characters of the newest message shown in chat lists
+    CHAT_LIST_PREVIEW_CHARS: int = 120
+    # messages of deleted chats are purged in the background, in batches
+    CHAT_PURGE_ENABLED: bool = True
+    CHAT_PURGE_INTERVAL: int = 30
+    CHAT_PURGE_BATCH_SIZE: int = 500
+    # seconds between two batches, to throttle the purge
+    CHAT_PURGE_BATCH_PAUSE: float = 0.2
+    CHAT_PURGE_MAX_BATCHES: int = 100
+    # seconds a finished generation stays replayable for reconnecting clients
+    GENERATION_STREAM_TTL: int = 300
+    # authenticated user cache: per-process LRU in front of Redis
+    USER_CACHE_LOCAL_SIZE: int = 10000
+    USER_CACHE_LOCAL_TTL: int = 30
+    USER_CACHE_TTL: int = 600
 
     @computed_field
     @property
@@ -46,10 +94,18 @@ class Settings(BaseSettings):
             scheme="redis",
             host=self.REDIS_HOST,
             port=self.REDIS_PORT,
-            password=self.REDIS_PASSWORD,
-            path=f"/{self.REDIS_DB}",
+            password=self.REDIS_PASSWORD or None,
+            path=str(self.REDIS_DB),
         )
 
+    REDIS_MAX_CONNECTIONS: int = 100
+    # seconds to wait for a free connection when the pool is exhausted
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_POOL_WARM_CONNECTIONS: int = 10
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+
     # EMAIL
     EMAIL_ENABLED: bool = False
     EMAIL_FROM_NAME: str = "system"
@@ -59,6 +115,37 @@ class Settings(BaseSettings):
     SMTP_HOST: str = "smtp.qq.com"
     SMTP_USERNAME: str = ""
     SMTP_PASSWORD: str = ""
+    SMTP_TIMEOUT: float = 10.0
+    # queued mails are delivered by a worker over persistent SMTP connections
+    MAIL_WORKER_ENABLED: bool = True
+    MAIL_SMTP_CONNECTIONS: int = 2
+    MAIL_SMTP_IDLE_TIMEOUT: int = 60
+    MAIL_MAX_ATTEMPTS: int = 5
+    # seconds before the first retry, doubled on every further attempt
+    MAIL_RETRY_BACKOFF: float = 2.0
+    MAIL_STATUS_TTL: int = 86400
+
+    # PASSWORD HASHING
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    # hash/verify calls allowed to wait for a worker before rejecting
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # CAPTCHA
+    # pre-rendered image captchas kept ready by a background thread
+    CAPTCHA_POOL_SIZE: int = 200
+    CAPTCHA_POOL_LOW_WATER: int = 50
+
+    # RATE LIMIT
+    # "count/period" token buckets separated by ";", period one of
+    # second/minute/hour/day; an empty value disables a limit
+    RATE_LIMIT_ENABLED: bool = True
+    # take the client IP from X-Forwarded-For, only behind a trusted proxy
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    RATE_LIMIT_CHAT_MESSAGES: str = "20/minute;500/day"
+    RATE_LIMIT_CAPTCHA_IMAGE: str = "30/minute"
+    RATE_LIMIT_CAPTCHA_EMAIL: str = "5/minute;50/day"
+    RATE_LIMIT_CAPTCHA_EMAIL_RECIPIENT: str = "1/minute;10/day"
 
     # TOKEN
     SECRET_KEY: str = secrets.token_urlsafe(nbytes=32)
@@ -66,11 +153,34 @@ class Settings(BaseSettings):
     # 60 minutes * 24 hours * 8 days = 8 days 八天有效期
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     API_VER_STR: str = "/api/v1"
+    # verified access tokens kept in memory until they expire
+    TOKEN_CACHE_SIZE: int = 10000
+    # token of the `X-Internal-Token` header of `/internal/stats`, an empty
+    # value disables the endpoint
+    INTERNAL_STATS_TOKEN: str = ""
 
     # LLM
     MODEL_API_KEY: str = ""
     MODEL_BASE_URL: str = "https://api.deepseek.com"
     MODEL_NAME: str = "deepseek-chat"
+    # shared HTTP connection pool towards the model provider
+    MODEL_MAX_CONNECTIONS: int = 500
+    MODEL_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    MODEL_CONNECT_TIMEOUT: float = 5.0
+    # per-request timeouts, in seconds
+    MODEL_STREAM_TIMEOUT: float = 120.0
+    MODEL_TITLE_TIMEOUT: float = 15.0
+    MODEL_MAX_RETRIES: int = 2
+    # maximum number of concurrent upstream completions per worker
+    MODEL_MAX_IN_FLIGHT: int = 400
+    # sampling temperature of chat answers, None leaves the provider default
+    MODEL_CHAT_TEMPERATURE: float | None = None
+    # exact-match response cache; titles always use it, chat answers only
+    # with MODEL_CHAT_CACHE or a temperature of 0
+    MODEL_CACHE_ENABLED: bool = True
+    MODEL_CHAT_CACHE: bool = False
+    MODEL_CACHE_TTL: int = 60 * 60 * 24 * 7
+    MODEL_CACHE_MAX_ENTRIES: int = 100000
 
 
 settings = Settings()
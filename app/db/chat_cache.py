@@ -0,0 +1,151 @@
+from dataclasses import asdict, dataclass
+from uuid import UUID
+
+from app.core.config import settings
+from app.db.redis_client import r
+from app.models.db_models.chat import MessageInfo
+from app.utils.logger import logger
+
+
+@dataclass
+class ChatCacheStats:
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "hit_ratio": round(self.hit_ratio, 4)}
+
+
+chat_cache_stats = ChatCacheStats()
+
+# Appends a turn only when the cached list ends right before it, otherwise a
+# write raced with a refill (e.g. a reply finishing after the next turn read
+# the chat) and the list is dropped, to be reloaded from Postgres.
+#
+# KEYS: the turns of the chat
+# ARGV: the turn as JSON, its sequence, CHAT_CACHE_TURNS, CHAT_CACHE_TTL
+# returns: 1 if appended, 0 if the chat was not cached or got dropped
+APPEND_TURN_SCRIPT = """
+local tail = redis.call('LINDEX', KEYS[1], -1)
+if not tail then
+    return 0
+end
+if cjson.decode(tail)['sequence'] ~= tonumber(ARGV[2]) - 1 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[3]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+append_turn = r.register_script(APPEND_TURN_SCRIPT)
+
+
+def get_chat_turns_key(chat_id: UUID) -> str:
+    return f"chat:{chat_id}:turns"
+
+
+async def get_cached_turns(
+    chat_id: UUID, last_sequence: int | None = None
+) -> list[MessageInfo] | None:
+    """
+    Reads the recent turns of a chat from the hot conversation cache.
+
+    A hit also extends the TTL of the chat, so active chats stay cached.
+
+    Args:
+        chat_id (UUID): The chat to read.
+        last_sequence (int | None): Sequence of the newest committed message.
+            A cache that does not end with it missed a write and is stale.
+
+    Returns:
+        list[MessageInfo] | None: The cached turns, oldest first, or None on a
+            miss or when Redis is unavailable.
+    """
+    key = get_chat_turns_key(chat_id)
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, settings.CHAT_CACHE_TTL)
+        raw_turns, _ = await pipe.execute()
+    except Exception as e:
+        chat_cache_stats.errors += 1
+        logger.error(f"Failed to read the chat cache:\n{e}")
+        return None
+
+    turns = [MessageInfo.model_validate_json(turn) for turn in raw_turns]
+    if not turns or (
+        last_sequence is not None and turns[-1].sequence != last_sequence
+    ):
+        chat_cache_stats.misses += 1
+        return None
+    chat_cache_stats.hits += 1
+    return turns
+
+
+async def fill_cached_turns(chat_id: UUID, messages: list[MessageInfo]) -> None:
+    """
+    Replaces the cached turns of a chat, after a miss was served from Postgres.
+
+    Args:
+        chat_id (UUID): The chat to cache.
+        messages (list[MessageInfo]): The most recent turns, oldest first.
+    """
+    if not messages:
+        return
+    key = get_chat_turns_key(chat_id)
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.rpush(key, *[message.model_dump_json() for message in messages])
+        pipe.ltrim(key, -settings.CHAT_CACHE_TURNS, -1)
+        pipe.expire(key, settings.CHAT_CACHE_TTL)
+        await pipe.execute()
+    except Exception as e:
+        chat_cache_stats.errors += 1
+        logger.error(f"Failed to fill the chat cache:\n{e}")
+
+
+async def append_cached_turn(chat_id: UUID, message: MessageInfo) -> None:
+    """
+    Writes a newly stored message through to the cache.
+
+    Only a cached list ending with the previous sequence is appended to, a
+    cold chat is loaded in full from Postgres on its next read instead of
+    caching a partial history, and a list that missed a message is dropped.
+
+    Args:
+        chat_id (UUID): The chat the message belongs to.
+        message (MessageInfo): The message that was just committed.
+    """
+    try:
+        await append_turn(
+            keys=[get_chat_turns_key(chat_id)],
+            args=[
+                message.model_dump_json(),
+                message.sequence,
+                settings.CHAT_CACHE_TURNS,
+                settings.CHAT_CACHE_TTL,
+            ],
+            client=r,
+        )
+    except Exception as e:
+        chat_cache_stats.errors += 1
+        logger.error(f"Failed to write through the chat cache:\n{e}")
+
+
+async def invalidate_cached_turns(chat_id: UUID) -> None:
+    """Drops the cached turns of a chat, e.g. once it was deleted."""
+    try:
+        await r.delete(get_chat_turns_key(chat_id))
+    except Exception as e:
+        chat_cache_stats.errors += 1
+        logger.error(f"Failed to invalidate the chat cache:\n{e}")
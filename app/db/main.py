@@ -3,13 +3,21 @@ from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends, FastAPI, HTTPException, status
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db.postgres_client import get_db_session, init_tables, pg_engine
-from app.db.redis_client import r
-from app.models.db_models.tables import User
+from app.core.config import settings
+from app.db.maintenance import check_schema_version
+from app.db.postgres_client import dispose_engines, get_async_db_session
+from app.db.redis_client import r, warm_redis_pool
+from app.models.db_models.user import UserInfo
 from app.services import user_service
+from app.services.chat_purger import chat_purger
+from app.services.generation_stream import cancel_generations
+from app.utils.captcha_pool import captcha_pool
 from app.utils.logger import logger
+from app.utils.mail_queue import mail_worker
+from app.utils.model import close_model_client
+from app.utils.security import password_hasher
 from app.utils.token import TokenDep, get_access_token_info
 
 
@@ -18,7 +26,7 @@ async def init_db(_: FastAPI):
     """
     Initialize and manage database connections for the application.
 
-    This coroutine function initializes database tables, checks Redis connection,
+    This coroutine function checks the database schema version, checks Redis connection,
     and ensures proper disposal of connections upon completion. It is designed to be used
     as a dependency in FastAPI applications.
 
@@ -33,32 +41,57 @@ async def init_db(_: FastAPI):
         SystemExit: If database initialization fails, the application will exit with code 1.
 
     Notes:
-        - The function will attempt to initialize database tables and verify Redis connection.
+        - The function checks with one query that the database was migrated to the
+          schema version of the code (see `app.db.maintenance`), instead of issuing
+          DDL on every boot, and verifies the Redis connection.
+        - The Redis pool is warmed with REDIS_POOL_WARM_CONNECTIONS connections.
+        - The mail worker is started when email is enabled, unless MAIL_WORKER_ENABLED
+          is off because it runs as its own process (`python -m app.utils.mail_queue`).
         - On success, it yields control and manages connection cleanup when the context exits.
+        - Replies still being generated are stored as cancelled on shutdown.
+        - The chat purger removes the messages of deleted chats in the background.
         - On failure, it logs the error and terminates the application.
         - Both PostgreSQL and Redis connections are properly closed when the context exits.
     """
     try:
-        # Create all tables
-        init_tables()
-        if not r.ping():
-            raise Exception("Redis connection failed")
+        # one query, the schema is migrated by `app.db.maintenance migrate`
+        await check_schema_version()
+        await warm_redis_pool(settings.REDIS_POOL_WARM_CONNECTIONS)
         logger.success("Database initialization successful")
+        captcha_pool.start()
+        if settings.EMAIL_ENABLED and settings.MAIL_WORKER_ENABLED:
+            mail_worker.start()
+        if settings.CHAT_PURGE_ENABLED:
+            chat_purger.start()
 
     except Exception as e:
         logger.error(f"Database initialization failed:\n{e}")
         exit(1)
     yield
-    pg_engine.dispose()
+    await cancel_generations()
+    await chat_purger.stop()
+    await mail_worker.stop()
+    await dispose_engines()
     logger.success("PostgreSQL connection closed")
-    r.close()
+    await r.aclose()
+    await r.connection_pool.disconnect()
     logger.success("Redis connection closed")
+    await close_model_client()
+    logger.success("Model client closed")
+    password_hasher.shutdown()
+    captcha_pool.stop()
 
 
-SessionDep = Annotated[Session, Depends(get_db_session)]
+# closed as soon as the route returns, so a streamed response (the replies of
+# `POST /chat/messages`) does not hold a pooled connection while it streams
+SessionDep = Annotated[
+    AsyncSession, Depends(get_async_db_session, scope="function")
+]
 
 
-def get_current_active_user(session: SessionDep, token: TokenDep) -> User:
+async def get_current_active_user(
+    session: SessionDep, token: TokenDep
+) -> UserInfo:
     """
     Retrieves the currently active user based on the provided session and token.
 
@@ -67,20 +100,21 @@ def get_current_active_user(session: SessionDep, token: TokenDep) -> User:
         token (TokenDep): The access token dependency containing user information.
 
     Returns:
-        User: The user object corresponding to the authenticated user.
+        UserInfo: The slim projection of the authenticated user.
 
     Raises:
         HTTPException: If the user is not found in the database (status code 404).
 
     Notes:
         - The function decodes the user ID from the access token payload.
-        - Uses the user service to fetch the user from the database.
+        - The user is served from the two-tier user cache when possible, so
+          most requests do not touch Postgres to authenticate.
         - Logs an error if the user lookup fails.
     """
     payload = get_access_token_info(token)
 
     try:
-        user = user_service.get_user_by_id(
+        user = await user_service.get_user_info_by_id(
             session=session, user_id=uuid.UUID(payload.user_id)
         )
     except Exception as e:
@@ -91,4 +125,53 @@ def get_current_active_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
-CurrentUser = Annotated[User, Depends(get_current_active_user)]
+CurrentUser = Annotated[UserInfo, Depends(get_current_active_user)]
+
+
+if __name__ == "__main__":
+    # measure the cold start of a worker against running Postgres and Redis:
+    #   python -m app.db.main
+    import statistics
+    import subprocess
+    import sys
+
+    # every round runs in a fresh interpreter, so imports are not cached
+    COLD_START_SCRIPT = """
+import asyncio
+import time
+
+began = time.perf_counter()
+import main
+
+imported = time.perf_counter()
+
+
+async def run_lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        started = time.perf_counter()
+    return started, time.perf_counter()
+
+
+started, stopped = asyncio.run(run_lifespan())
+print(imported - began, started - imported, stopped - started)
+"""
+
+    rounds = 5
+    samples = []
+    for _ in range(rounds):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(
+            [float(value) for value in result.stdout.splitlines()[-1].split()]
+        )
+    for name, values in zip(
+        ["import", "lifespan startup", "lifespan shutdown"], zip(*samples)
+    ):
+        print(
+            f"{name:>18}: median {statistics.median(values) * 1000:8.1f} ms, "
+            f"max {max(values) * 1000:8.1f} ms over {rounds} runs"
+        )
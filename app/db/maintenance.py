@@ -0,0 +1,293 @@
+import argparse
+
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import SQLModel
+
+from app.core.config import settings
+from app.db.postgres_client import get_async_pg_engine, get_pg_engine
+
+# registers the tables on SQLModel.metadata
+from app.models.db_models import tables  # noqa: F401
+from app.utils.logger import logger
+
+# one row holding the version the schema was last migrated to
+CREATE_SCHEMA_VERSION_TABLE = text(
+    """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        id boolean PRIMARY KEY DEFAULT true CHECK (id),
+        version integer NOT NULL,
+        migrated_at timestamp with time zone NOT NULL DEFAULT now()
+    )
+    """
+)
+
+SELECT_SCHEMA_VERSION = text("SELECT version FROM schema_version")
+
+RECORD_SCHEMA_VERSION = text(
+    """
+    INSERT INTO schema_version (id, version) VALUES (true, :version)
+    ON CONFLICT (id) DO UPDATE
+        SET version = excluded.version, migrated_at = now()
+    """
+)
+
+# transaction-level advisory lock, so processes migrating at once take turns
+MIGRATION_LOCK_ID = 724_001
+
+# columns that `create_all` does not add to an already existing chat table
+ADD_CHAT_COUNTER_COLUMNS = text(
+    """
+    ALTER TABLE chat
+        ADD COLUMN IF NOT EXISTS next_sequence integer NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS message_count integer NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS last_message_at timestamp with time zone
+    """
+)
+
+# timing columns of streamed assistant replies, missing from older tables
+ADD_MESSAGE_STREAM_COLUMNS = text(
+    """
+    ALTER TABLE message
+        ADD COLUMN IF NOT EXISTS first_token_at timestamp with time zone,
+        ADD COLUMN IF NOT EXISTS finished_at timestamp with time zone
+    """
+)
+
+CREATE_CHAT_LIST_INDEX = text(
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_owner_id_updated_at
+        ON chat (owner_id, updated_at, id)
+        WHERE is_deleted = false
+    """
+)
+
+CREATE_DELETED_CHAT_INDEX = text(
+    """
+    CREATE INDEX IF NOT EXISTS ix_chat_deleted_at
+        ON chat (deleted_at)
+        WHERE is_deleted = true
+    """
+)
+
+# renumbers messages per chat, fixing sequences duplicated by concurrent writes
+RENUMBER_MESSAGE_SEQUENCES = text(
+    """
+    UPDATE message
+    SET sequence = ordered.position - 1
+    FROM (
+        SELECT
+            id,
+            row_number() OVER (
+                PARTITION BY chat_id ORDER BY sequence, created_at, id
+            ) AS position
+        FROM message
+    ) AS ordered
+    WHERE message.id = ordered.id AND message.sequence <> ordered.position - 1
+    """
+)
+
+CREATE_MESSAGE_SEQUENCE_INDEX = text(
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_message_chat_id_sequence
+        ON message (chat_id, sequence)
+    """
+)
+
+RECOUNT_CHAT_MESSAGES = text(
+    """
+    UPDATE chat
+    SET
+        message_count = coalesce(stats.message_count, 0),
+        last_message_at = stats.last_message_at,
+        next_sequence = coalesce(stats.max_sequence + 1, 0)
+    FROM chat AS target
+    LEFT JOIN (
+        SELECT
+            chat_id,
+            count(*) AS message_count,
+            max(created_at) AS last_message_at,
+            max(sequence) AS max_sequence
+        FROM message
+        GROUP BY chat_id
+    ) AS stats ON stats.chat_id = target.id
+    WHERE chat.id = target.id
+        AND (
+            chat.message_count <> coalesce(stats.message_count, 0)
+            OR chat.last_message_at IS DISTINCT FROM stats.last_message_at
+            OR chat.next_sequence <> coalesce(stats.max_sequence + 1, 0)
+        )
+    """
+)
+
+
+def repair_chat_counters(conn: Connection) -> int:
+    """
+    Backfills and repairs the denormalized message counters of every chat.
+
+    Adds the counter columns when they are missing, removes duplicate message
+    sequences left over from before the unique index existed, then recomputes
+    `message_count`, `last_message_at` and `next_sequence` from the message table.
+    Running it again on consistent data changes nothing.
+
+    Args:
+        conn (Connection): A synchronous connection inside a transaction.
+
+    Returns:
+        int: The number of chats whose counters were corrected.
+    """
+    conn.execute(ADD_CHAT_COUNTER_COLUMNS)
+    has_sequence_index = conn.execute(
+        text("SELECT to_regclass('ix_message_chat_id_sequence') IS NOT NULL")
+    ).scalar_one()
+    if not has_sequence_index:
+        conn.execute(RENUMBER_MESSAGE_SEQUENCES)
+        conn.execute(CREATE_MESSAGE_SEQUENCE_INDEX)
+
+    return conn.execute(RECOUNT_CHAT_MESSAGES).rowcount
+
+
+def add_message_stream_columns(conn: Connection) -> None:
+    """
+    Adds the `first_token_at` and `finished_at` columns to an existing
+    message table. Does nothing when they already exist.
+
+    Args:
+        conn (Connection): A synchronous connection inside a transaction.
+    """
+    conn.execute(ADD_MESSAGE_STREAM_COLUMNS)
+
+
+def create_chat_indexes(conn: Connection) -> None:
+    """
+    Creates the partial indexes of the chat table: the one serving chat
+    lists, which skips deleted chats, and the one the purger walks. A chat
+    list index created before it was partial is replaced.
+
+    Args:
+        conn (Connection): A synchronous connection inside a transaction.
+    """
+    is_full_index = conn.execute(
+        text(
+            "SELECT indpred IS NULL FROM pg_index "
+            "WHERE indexrelid = to_regclass('ix_chat_owner_id_updated_at')"
+        )
+    ).scalar()
+    if is_full_index:
+        conn.execute(text("DROP INDEX ix_chat_owner_id_updated_at"))
+    conn.execute(CREATE_CHAT_LIST_INDEX)
+    conn.execute(CREATE_DELETED_CHAT_INDEX)
+
+
+def create_tables(conn: Connection) -> None:
+    """Creates the tables and indexes of the models that do not exist yet."""
+    SQLModel.metadata.create_all(conn)
+
+
+# Step n brings the schema to version n + 1. A new database gets the current
+# tables from the first step, so every later step must be a no-op on them;
+# databases created before versioning start at 0 and are upgraded in place.
+# Append new steps, never reorder or remove one.
+MIGRATIONS = (
+    create_tables,
+    repair_chat_counters,
+    add_message_stream_columns,
+    create_chat_indexes,
+)
+
+# the version this code runs against
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: Connection) -> int:
+    """
+    Applies the migrations the database is missing and records its version.
+
+    Args:
+        conn (Connection): A synchronous connection inside a transaction.
+
+    Returns:
+        int: The number of migrations applied.
+    """
+    conn.execute(
+        text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+    )
+    conn.execute(CREATE_SCHEMA_VERSION_TABLE)
+    version = conn.execute(SELECT_SCHEMA_VERSION).scalar() or 0
+    for step in MIGRATIONS[version:]:
+        logger.info(f"Applying migration {step.__name__}")
+        step(conn)
+    if version >= SCHEMA_VERSION:
+        return 0
+    conn.execute(RECORD_SCHEMA_VERSION, {"version": SCHEMA_VERSION})
+    return SCHEMA_VERSION - version
+
+
+async def check_schema_version() -> int:
+    """
+    Checks at boot, with a single query, that the database was migrated.
+
+    With POSTGRESQL_AUTO_MIGRATE the missing migrations are applied instead,
+    which is meant for development.
+
+    Returns:
+        int: The version of the database.
+
+    Raises:
+        RuntimeError: If the database is behind SCHEMA_VERSION.
+    """
+    engine = get_async_pg_engine()
+    try:
+        async with engine.connect() as conn:
+            version = (await conn.execute(SELECT_SCHEMA_VERSION)).scalar() or 0
+    except ProgrammingError:
+        # no schema_version table, a new database or one never migrated
+        version = 0
+
+    if version < SCHEMA_VERSION and settings.POSTGRESQL_AUTO_MIGRATE:
+        async with engine.begin() as conn:
+            if applied := await conn.run_sync(migrate):
+                logger.success(f"Applied {applied} migrations")
+        return SCHEMA_VERSION
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected "
+            f"{SCHEMA_VERSION}: run `python -m app.db.maintenance migrate`"
+        )
+    if version > SCHEMA_VERSION:
+        # e.g. an older worker during a rolling deploy, steps only add
+        logger.warning(
+            f"Database schema is at version {version}, newer than "
+            f"{SCHEMA_VERSION}"
+        )
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database maintenance")
+    parser.add_argument(
+        "command",
+        choices=[
+            "migrate",
+            "repair-chat-counters",
+            "add-message-stream-columns",
+            "create-chat-indexes",
+        ],
+    )
+    args = parser.parse_args()
+
+    with get_pg_engine().begin() as conn:
+        if args.command == "migrate":
+            applied = migrate(conn)
+            logger.success(
+                f"Schema at version {SCHEMA_VERSION}, {applied} migrations applied"
+            )
+        elif args.command == "repair-chat-counters":
+            repaired = repair_chat_counters(conn)
+            logger.success(f"Chat counters repaired: {repaired} chats updated")
+        elif args.command == "add-message-stream-columns":
+            add_message_stream_columns(conn)
+            logger.success("Message stream columns added")
+        elif args.command == "create-chat-indexes":
+            create_chat_indexes(conn)
+            logger.success("Chat indexes created")
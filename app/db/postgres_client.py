@@ -1,17 +1,191 @@
-from sqlalchemy import Engine
-from sqlmodel import Session, SQLModel, create_engine
+import time
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
+from app.utils.logger import logger
+
+
+@dataclass
+class PostgresPoolStats:
+    checkouts: int = 0
+    # new connections opened, and connections dropped (e.g. by the pre-ping)
+    connects: int = 0
+    invalidations: int = 0
+    # checkouts that gave up after POSTGRESQL_POOL_TIMEOUT seconds
+    timeouts: int = 0
+    # time spent obtaining a connection, opening it included
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        attempts = self.checkouts + self.timeouts
+        return self.wait_seconds / attempts if attempts else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "mean_wait_seconds": round(self.mean_wait_seconds, 4),
+        }
+
+
+postgres_pool_stats = PostgresPoolStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    The queue pool of the async engine, timing how long every checkout waits.
+
+    SQLAlchemy has no event before a checkout, so the wait is measured around
+    `_do_get`. Waits longer than POSTGRESQL_POOL_WAIT_WARNING are logged with
+    the pool usage, so an exhausted pool does not queue requests unnoticed.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        began = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            postgres_pool_stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - began
+            postgres_pool_stats.wait_seconds += waited
+            postgres_pool_stats.max_wait_seconds = max(
+                postgres_pool_stats.max_wait_seconds, waited
+            )
+            if waited > settings.POSTGRESQL_POOL_WAIT_WARNING:
+                logger.warning(
+                    f"Waited {waited:.3f}s for a PostgreSQL connection, "
+                    f"{self.checkedout()} checked out, "
+                    f"{max(self.overflow(), 0)} in overflow"
+                )
+
+
+def count_pool_checkout(*_) -> None:
+    postgres_pool_stats.checkouts += 1
+
+
+def count_pool_connect(*_) -> None:
+    postgres_pool_stats.connects += 1
+
+
+def count_pool_invalidation(*_) -> None:
+    postgres_pool_stats.invalidations += 1
+
 
-pg_engine: Engine = create_engine(url=str(settings.POSTGRESQL_URI))
+# engines are created on first use, so importing the app (e.g. in a worker
+# that never touches Postgres) builds no connection pool
+_pg_engine: Engine | None = None
+_async_pg_engine: AsyncEngine | None = None
+_async_session_maker: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_pg_engine() -> Engine:
+    """Returns the synchronous engine, only meant for scripts and maintenance."""
+    global _pg_engine
+    if _pg_engine is None:
+        _pg_engine = create_engine(
+            url=str(settings.POSTGRESQL_URI),
+            pool_pre_ping=settings.POSTGRESQL_POOL_PRE_PING,
+            pool_recycle=settings.POSTGRESQL_POOL_RECYCLE,
+        )
+    return _pg_engine
+
+
+def get_async_pg_engine() -> AsyncEngine:
+    """Returns the pooled asyncpg engine serving requests."""
+    global _async_pg_engine
+    if _async_pg_engine is None:
+        _async_pg_engine = create_async_engine(
+            url=str(settings.POSTGRESQL_ASYNC_URI),
+            poolclass=TimedQueuePool,
+            pool_size=settings.POSTGRESQL_POOL_SIZE,
+            max_overflow=settings.POSTGRESQL_MAX_OVERFLOW,
+            pool_timeout=settings.POSTGRESQL_POOL_TIMEOUT,
+            pool_recycle=settings.POSTGRESQL_POOL_RECYCLE,
+            pool_pre_ping=settings.POSTGRESQL_POOL_PRE_PING,
+        )
+        pool = _async_pg_engine.sync_engine.pool
+        event.listen(pool, "checkout", count_pool_checkout)
+        event.listen(pool, "connect", count_pool_connect)
+        event.listen(pool, "invalidate", count_pool_invalidation)
+    return _async_pg_engine
+
+
+def get_postgres_pool_stats() -> dict:
+    """
+    Reports the usage of the connection pool of the async engine.
+
+    Returns:
+        dict: The configured size, connections checked out, in overflow and
+            idle, along with the checkout counters and wait times.
+    """
+    stats = {
+        "pool_size": settings.POSTGRESQL_POOL_SIZE,
+        "max_overflow": settings.POSTGRESQL_MAX_OVERFLOW,
+        "checked_out": 0,
+        "overflow": 0,
+        "idle": 0,
+    }
+    if _async_pg_engine is not None:
+        pool = _async_pg_engine.sync_engine.pool
+        if isinstance(pool, TimedQueuePool):
+            stats.update(
+                checked_out=pool.checkedout(),
+                # negative while the pool has not opened pool_size connections
+                overflow=max(pool.overflow(), 0),
+                idle=pool.checkedin(),
+            )
+    return {**stats, **postgres_pool_stats.to_dict()}
+
+
+def async_session_maker() -> AsyncSession:
+    """
+    Opens a session on the async engine, used like an `async_sessionmaker`:
+
+        async with async_session_maker() as session:
+            ...
+    """
+    global _async_session_maker
+    if _async_session_maker is None:
+        _async_session_maker = async_sessionmaker(
+            bind=get_async_pg_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False,
+        )
+    return _async_session_maker()
+
+
+async def dispose_engines() -> None:
+    """Closes the pooled connections of the engines created so far."""
+    global _pg_engine, _async_pg_engine, _async_session_maker
+    if _async_pg_engine is not None:
+        await _async_pg_engine.dispose()
+    if _pg_engine is not None:
+        _pg_engine.dispose()
+    _pg_engine = _async_pg_engine = _async_session_maker = None
 
 
 def get_db_session():
     """
-    Generator function to yield a database session.
+    Generator function to yield a synchronous database session.
 
     This function creates a context-managed database session using the provided PostgreSQL engine.
     The session is yielded for use in database operations, ensuring proper cleanup after use.
+    Request handlers must use `get_async_db_session` instead, this one is kept for scripts.
 
     Yields:
         sqlalchemy.orm.Session: A SQLAlchemy database session object.
@@ -21,23 +195,20 @@ def get_db_session():
         ...     # perform database operations
         ...     pass
     """
-    with Session(pg_engine) as session:
+    with Session(get_pg_engine()) as session:
         yield session
 
 
-def init_tables():
+async def get_async_db_session():
     """
-    Initializes database tables by creating all tables defined in SQLModel metadata.
-
-    This function uses SQLModel's metadata to create all the database tables that have been
-    defined in the application's SQLModel classes. The tables are created in the database
-    connected through the global pg_engine instance.
+    Async generator function to yield an asynchronous database session.
 
-    Note:
-        This function should typically be called once during application startup to ensure
-        all required database tables exist before the application starts processing requests.
+    The session is bound to the pooled asyncpg engine, so awaiting a query never
+    blocks the event loop. Objects stay loaded after commit (`expire_on_commit=False`)
+    because attribute refreshes cannot happen implicitly in async code.
 
-    Raises:
-        SQLAlchemyError: If there is any error during the table creation process.
+    Yields:
+        AsyncSession: A SQLModel asynchronous database session object.
     """
-    SQLModel.metadata.create_all(pg_engine)
+    async with async_session_maker() as session:
+        yield session
@@ -1,18 +1,74 @@
-from redis import StrictRedis
+import asyncio
+from typing import Annotated
+
+from fastapi import Depends
+from redis.asyncio import BlockingConnectionPool, Redis
 
 from app.core.config import settings
 from app.utils.logger import logger
 
-r = StrictRedis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
+# bounded pool: once every connection is busy, callers wait up to
+# REDIS_POOL_TIMEOUT seconds for one to be released instead of opening more
+redis_pool = BlockingConnectionPool.from_url(
+    str(settings.REDIS_URL),
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
     decode_responses=True,
 )
 
+r = Redis(connection_pool=redis_pool)
+
+
+def get_redis() -> Redis:
+    """
+    Returns the shared asynchronous Redis client.
+
+    Returns:
+        Redis: The client bound to the process-wide connection pool.
+    """
+    return r
+
+
+RedisDep = Annotated[Redis, Depends(get_redis)]
+
+
+async def warm_redis_pool(connections: int) -> None:
+    """
+    Opens connections ahead of the first requests.
+
+    Concurrent PINGs force the pool to open up to `connections` sockets, which
+    then stay idle in the pool for reuse.
+
+    Args:
+        connections (int): Number of connections to open.
+    """
+    connections = min(connections, settings.REDIS_MAX_CONNECTIONS)
+    for pong in await asyncio.gather(*[r.ping() for _ in range(connections)]):
+        if not pong:
+            raise Exception("Redis connection failed")
+
+
+def get_redis_pool_stats() -> dict:
+    """
+    Reports the usage of the Redis connection pool.
+
+    Returns:
+        dict: Maximum size, connections in use and idle connections.
+    """
+    in_use = len(getattr(redis_pool, "_in_use_connections", ()))
+    idle = len(getattr(redis_pool, "_available_connections", ()))
+    return {
+        "max_connections": redis_pool.max_connections,
+        "in_use": in_use,
+        "idle": idle,
+    }
+
 
 if __name__ == "__main__":
     print(f"{settings.REDIS_URL=}")
 
-    if r.ping():
+    if asyncio.run(r.ping()):
         logger.success("Redis连接成功")
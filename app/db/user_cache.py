@@ -0,0 +1,104 @@
+from dataclasses import asdict, dataclass
+from uuid import UUID
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.db.redis_client import r
+from app.models.db_models.user import UserInfo
+from app.utils.logger import logger
+
+
+@dataclass
+class UserCacheStats:
+    local_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+    errors: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses
+        return hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "hit_ratio": round(self.hit_ratio, 4)}
+
+
+user_cache_stats = UserCacheStats()
+
+# first tier, local to the worker; kept short-lived because an invalidation
+# only reaches the worker that performed it
+local_user_cache: TTLCache[UUID, UserInfo] = TTLCache(
+    maxsize=settings.USER_CACHE_LOCAL_SIZE,
+    ttl=settings.USER_CACHE_LOCAL_TTL,
+)
+
+
+def get_user_key(user_id: UUID) -> str:
+    return f"user:{user_id}:info"
+
+
+async def get_cached_user(user_id: UUID) -> UserInfo | None:
+    """
+    Looks an authenticated user up in the in-process cache, then in Redis.
+
+    Args:
+        user_id (UUID): The user id taken from the access token.
+
+    Returns:
+        UserInfo | None: The cached projection, or None on a miss.
+    """
+    if user := local_user_cache.get(user_id):
+        user_cache_stats.local_hits += 1
+        return user
+
+    try:
+        raw_user = await r.get(get_user_key(user_id))
+    except Exception as e:
+        user_cache_stats.errors += 1
+        logger.error(f"Failed to read the user cache:\n{e}")
+        raw_user = None
+
+    if not raw_user:
+        user_cache_stats.misses += 1
+        return None
+    user_cache_stats.redis_hits += 1
+    user = UserInfo.model_validate_json(raw_user)  # type: ignore
+    local_user_cache[user_id] = user
+    return user
+
+
+async def cache_user(user: UserInfo) -> None:
+    """
+    Stores a user projection in both cache tiers.
+
+    Args:
+        user (UserInfo): The projection loaded from Postgres.
+    """
+    local_user_cache[user.id] = user
+    try:
+        await r.setex(
+            name=get_user_key(user.id),
+            time=settings.USER_CACHE_TTL,
+            value=user.model_dump_json(),
+        )
+    except Exception as e:
+        user_cache_stats.errors += 1
+        logger.error(f"Failed to write the user cache:\n{e}")
+
+
+async def invalidate_user(user_id: UUID) -> None:
+    """
+    Drops a user from both cache tiers after its row changed.
+
+    Args:
+        user_id (UUID): The user that was updated.
+    """
+    local_user_cache.pop(user_id, None)
+    try:
+        await r.delete(get_user_key(user_id))
+    except Exception as e:
+        user_cache_stats.errors += 1
+        logger.error(f"Failed to invalidate the user cache:\n{e}")
@@ -0,0 +1,208 @@
+import math
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+from app.db.main import CurrentUser
+from app.db.redis_client import r
+from app.utils.logger import logger
+
+RATE_LIMIT_PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 60 * 60,
+    "day": 60 * 60 * 24,
+}
+
+# Token buckets, one key per limit, refilled continuously at capacity/period.
+# A hit takes `cost` tokens from every bucket or, if any of them is short,
+# from none and returns how many milliseconds until all of them can serve it.
+# The clock is the one of Redis, so API workers need not agree on time.
+#
+# KEYS: the buckets
+# ARGV: cost, then capacity and refill rate (tokens per ms) for each bucket
+# returns: {allowed (1/0), retry after in ms}
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    tokens = math.min(capacity, tokens + elapsed * rate)
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) / rate))
+    end
+    levels[i] = tokens
+end
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+end
+
+if wait == 0 then
+    return {1, 0}
+end
+return {0, wait}
+"""
+
+token_bucket = r.register_script(TOKEN_BUCKET_SCRIPT)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    count: int
+    period: int
+
+    @classmethod
+    def parse(cls, limit: str) -> "RateLimit":
+        """Parses a limit such as "20/minute" or "500/day"."""
+        count, _, period = limit.strip().partition("/")
+        return cls(count=int(count), period=RATE_LIMIT_PERIODS[period.strip()])
+
+
+class RateLimiter:
+    """
+    Limits how often one client may call a route, using token buckets in Redis.
+
+    `limits` holds one or more limits separated by ";", for instance
+    "20/minute;500/day" allows bursts of 20 calls refilled over a minute,
+    and at most 500 calls per day. An empty string disables the limiter.
+
+    Attributes:
+        name (str): Name of the limited route, part of the bucket keys.
+        limits (tuple[RateLimit, ...]): The limits, all of which must allow a call.
+    """
+
+    def __init__(self, name: str, limits: str):
+        self.name = name
+        self.limits = tuple(
+            RateLimit.parse(limit)
+            for limit in limits.split(";")
+            if limit.strip()
+        )
+
+    def get_bucket_keys(self, identity: str) -> list[str]:
+        # the hash tag keeps all buckets of a client in one cluster slot
+        return [
+            f"ratelimit:{{{self.name}:{identity}}}:{limit.count}/{limit.period}"
+            for limit in self.limits
+        ]
+
+    async def hit(self, identity: str, cost: int = 1) -> float:
+        """
+        Takes `cost` tokens for `identity` from every bucket of the route.
+
+        Args:
+            identity (str): The client, a user ID or an IP address.
+            cost (int): Tokens the call consumes.
+
+        Returns:
+            float: 0 if the call is allowed, otherwise the seconds to wait
+                before it would be. Calls are allowed when Redis is unavailable.
+        """
+        if not settings.RATE_LIMIT_ENABLED or not self.limits:
+            return 0
+        args: list[float] = [cost]
+        for limit in self.limits:
+            args += [limit.count, limit.count / (limit.period * 1000)]
+        try:
+            allowed, retry_after_ms = await token_bucket(
+                keys=self.get_bucket_keys(identity), args=args
+            )
+        except Exception as e:
+            logger.error(f"Rate limiter {self.name} unavailable:\n{e}")
+            return 0
+        return 0 if allowed else retry_after_ms / 1000
+
+    async def check(self, identity: str) -> None:
+        """
+        Rejects the call when `identity` is over one of the limits.
+
+        Raises:
+            HTTPException: 429 Too Many Requests with a `Retry-After` header
+                in whole seconds when `identity` is over one of the limits.
+        """
+        retry_after = await self.hit(identity)
+        if retry_after:
+            logger.warning(f"Rate limit of {self.name} hit by {identity}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+def get_client_ip(request: Request) -> str:
+    """
+    Returns the address of the client, taken from `X-Forwarded-For` only when
+    RATE_LIMIT_TRUST_FORWARDED says a trusted proxy sets it.
+    """
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_ip(name: str, limits: str) -> Callable[[Request], Awaitable[None]]:
+    """
+    Builds a route dependency limiting each client IP address.
+
+    Usage:
+        @router.get("/path", dependencies=[Depends(limit_by_ip("path", "5/minute"))])
+    """
+    limiter = RateLimiter(name, limits)
+
+    async def check_ip_rate_limit(request: Request) -> None:
+        await limiter.check(get_client_ip(request))
+
+    return check_ip_rate_limit
+
+
+def limit_by_user(
+    name: str, limits: str
+) -> Callable[[CurrentUser], Awaitable[None]]:
+    """
+    Builds a route dependency limiting each authenticated user.
+
+    The current user is resolved once per request, so a route depending on
+    `CurrentUser` itself does not authenticate twice.
+    """
+    limiter = RateLimiter(name, limits)
+
+    async def check_user_rate_limit(current_user: CurrentUser) -> None:
+        await limiter.check(str(current_user.id))
+
+    return check_user_rate_limit
+
+
+chat_message_rate_limit = limit_by_user(
+    "chat_messages", settings.RATE_LIMIT_CHAT_MESSAGES
+)
+captcha_image_rate_limit = limit_by_ip(
+    "captcha_image", settings.RATE_LIMIT_CAPTCHA_IMAGE
+)
+captcha_email_rate_limit = limit_by_ip(
+    "captcha_email", settings.RATE_LIMIT_CAPTCHA_EMAIL
+)
+
+# a second limit per recipient, so one address cannot be flooded with mails
+captcha_email_recipient_rate_limiter = RateLimiter(
+    "captcha_email_recipient", settings.RATE_LIMIT_CAPTCHA_EMAIL_RECIPIENT
+)
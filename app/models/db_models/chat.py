@@ -22,7 +22,7 @@ class MessageBase(SQLModel):
     chat_id: UUID = Field(foreign_key="chat.id")
     role: str = Field(max_length=50)
     content: str
-    sequence: int = Field(default=0, index=True)
+    sequence: int = Field(default=0)
 
 
 class MessageInfo(SQLModel):
@@ -44,3 +44,13 @@ class MessageRole(Enum):
     USER = "user"
     ASSISTANT = "assistant"
     SYSTEM = "system"
+
+
+class MessageStatus(Enum):
+    # messages stored in one piece keep the default status of CommonFields
+    ACTIVE = "active"
+    # an assistant reply that is still being generated and checkpointed
+    STREAMING = "streaming"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
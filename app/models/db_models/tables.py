@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from typing import List
 from uuid import UUID
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship, SQLModel
 
 from app.models.db_models.chat import ChatBase, MessageBase
@@ -30,10 +31,51 @@ class User(UserBase, CommonFields, table=True):
 
 # 会话记录表
 class Chat(ChatBase, CommonFields, table=True):
+    __table_args__ = (
+        # chat lists of a user, most recently active first; deleted chats
+        # are left out, so reads never walk over them
+        Index(
+            "ix_chat_owner_id_updated_at",
+            "owner_id",
+            "updated_at",
+            "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+        # deleted chats waiting for the purger
+        Index(
+            "ix_chat_deleted_at",
+            "deleted_at",
+            postgresql_where=text("is_deleted = true"),
+        ),
+    )
+
+    # sequence handed to the next message, bumped atomically on insert
+    next_sequence: int = Field(
+        default=0, nullable=False, sa_column_kwargs={"server_default": "0"}
+    )
+    # denormalized counters, maintained together with message inserts
+    message_count: int = Field(
+        default=0, nullable=False, sa_column_kwargs={"server_default": "0"}
+    )
+    last_message_at: datetime | None = Field(default=None, nullable=True)
+
     user: User = Relationship(back_populates="chats")
     messages: List["Message"] = Relationship(back_populates="chat")
 
 
 # 对话历史表
 class Message(MessageBase, CommonFields, table=True):
+    __table_args__ = (
+        Index(
+            "ix_message_chat_id_sequence",
+            "chat_id",
+            "sequence",
+            unique=True,
+        ),
+    )
+
+    # timing of streamed assistant replies
+    first_token_at: datetime | None = Field(default=None, nullable=True)
+    finished_at: datetime | None = Field(default=None, nullable=True)
+
     chat: Chat = Relationship(back_populates="messages")
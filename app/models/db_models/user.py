@@ -1,3 +1,5 @@
+from uuid import UUID
+
 from sqlmodel import Field, SQLModel
 
 
@@ -15,3 +17,12 @@ class UserUpdate(SQLModel):
     username: str | None = Field(default=None, max_length=255)
     email: str | None = Field(default=None, max_length=255)
     password_hash: str | None = Field(default=None, max_length=255)
+
+
+class UserInfo(SQLModel):
+    """Slim projection of an authenticated user, never holds the password."""
+
+    id: UUID
+    username: str
+    email: str
+    status: str
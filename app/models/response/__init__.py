@@ -9,3 +9,6 @@ class ResponseBase(BaseModel, Generic[T]):
     code: str = Field(default="0", description="Business Code")
     msg: str = Field(default="ok")
     data: T | None = None
+    next_cursor: str | None = Field(
+        default=None, description="Opaque cursor of the next page"
+    )
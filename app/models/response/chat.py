@@ -10,6 +10,11 @@ class ChatInfoItem(BaseModel):
     title: str
     updated_at: datetime
     created_at: datetime
+    message_count: int = 0
+    last_message_at: datetime | None = None
+    # the start of the newest message, for chat lists
+    last_message_role: str | None = None
+    last_message_preview: str | None = None
 
 
 class TitleUpdateItem(BaseModel):
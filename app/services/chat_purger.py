@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+
+from app.core.config import settings
+from app.db.postgres_client import async_session_maker
+from app.db.redis_client import r
+from app.services import chat_service
+from app.utils.logger import logger
+
+# held by the worker purging, so the API workers do not purge the same chats
+CHAT_PURGE_LOCK_KEY = "chat-purger:lock"
+
+# Deletes the lock only while it still holds the token of its taker: a round
+# outlasting the expiry must not release the lock another worker took since.
+#
+# KEYS: the lock
+# ARGV: the token of the worker releasing it
+# returns: 1 if released, 0 if the lock expired or belongs to another worker
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+release_lock = r.register_script(RELEASE_LOCK_SCRIPT)
+
+
+class ChatPurger:
+    """
+    Removes soft-deleted chats and their messages in the background.
+
+    Every CHAT_PURGE_INTERVAL seconds one worker takes a Redis lock and
+    deletes messages of deleted chats CHAT_PURGE_BATCH_SIZE rows at a time,
+    pausing CHAT_PURGE_BATCH_PAUSE seconds between batches, so a long chat
+    never holds locks on the message table for long nor saturates Postgres.
+    At most CHAT_PURGE_MAX_BATCHES batches run per round.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(), name="chat-purger")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat purge failed:\n{e}")
+            await asyncio.sleep(settings.CHAT_PURGE_INTERVAL)
+
+    async def purge(self) -> int:
+        """
+        Runs one purge round, if no other worker is running one.
+
+        Returns:
+            int: The number of deleted messages.
+        """
+        token = uuid.uuid4().hex
+        locked = await r.set(
+            CHAT_PURGE_LOCK_KEY,
+            token,
+            nx=True,
+            ex=max(settings.CHAT_PURGE_INTERVAL, 60),
+        )
+        if not locked:
+            return 0
+
+        purged = 0
+        batches = 0
+        try:
+            async with async_session_maker() as session:
+                chat_ids = await chat_service.get_deleted_chat_ids(
+                    session=session, limit=settings.CHAT_PURGE_MAX_BATCHES
+                )
+                for chat_id in chat_ids:
+                    while batches < settings.CHAT_PURGE_MAX_BATCHES:
+                        batches += 1
+                        deleted = await chat_service.purge_deleted_chat(
+                            session=session,
+                            chat_id=chat_id,
+                            batch_size=settings.CHAT_PURGE_BATCH_SIZE,
+                        )
+                        purged += deleted
+                        await asyncio.sleep(settings.CHAT_PURGE_BATCH_PAUSE)
+                        if not deleted:
+                            break
+        finally:
+            await release_lock(
+                keys=[CHAT_PURGE_LOCK_KEY], args=[token], client=r
+            )
+
+        if purged:
+            logger.info(f"Purged {purged} messages of deleted chats")
+        return purged
+
+
+chat_purger = ChatPurger()
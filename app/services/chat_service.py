@@ -1,63 +1,257 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
 from uuid import UUID
 
-from sqlmodel import Session, asc, desc, select
+from sqlalchemy import delete, false, func, true, tuple_
+from sqlmodel import asc, col, desc, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.config import settings
+from app.db import chat_cache
 from app.models.db_models.chat import (
     ChatCreate,
-    MessageCreate,
     MessageInfo,
+    MessageStatus,
     TitleUpdate,
 )
 from app.models.db_models.tables import Chat, Message
-from app.models.response.chat import ChatInfoItem
+from app.models.response.chat import ChatInfoItem, TitleUpdateItem
 
 
-def create_new_chat(
+async def create_new_chat(
     *,
-    session: Session,
+    session: AsyncSession,
     new_chat_info: ChatCreate,
 ) -> ChatInfoItem:
     db_chat = Chat.model_validate(new_chat_info)
 
     session.add(db_chat)
-    session.commit()
-    session.refresh(db_chat)
+    await session.commit()
+    await session.refresh(db_chat)
     return ChatInfoItem(
         id=db_chat.id,
         title=db_chat.title,
         created_at=db_chat.created_at,
         updated_at=db_chat.updated_at,
         owner_id=db_chat.owner_id,
+        message_count=db_chat.message_count,
+        last_message_at=db_chat.last_message_at,
     )
 
 
-def update_chat_title(*, session: Session, new_title_info: TitleUpdate):
-    stmt = select(Chat).where(Chat.id == new_title_info.chat_id)
-    db_chat = session.exec(stmt).one()
+async def update_chat_title(
+    *, session: AsyncSession, new_title_info: TitleUpdate
+):
+    stmt = select(Chat).where(
+        Chat.id == new_title_info.chat_id, col(Chat.is_deleted) == false()
+    )
+    db_chat = (await session.exec(stmt)).one()
     new_chat_data = new_title_info.model_dump(exclude_unset=True)
 
     db_chat.sqlmodel_update(new_chat_data)
     session.add(db_chat)
-    session.commit()
+    await session.commit()
 
 
-def delete_chat(
+async def delete_chat(
     *,
-    session: Session,
+    session: AsyncSession,
     chat_id: UUID,
-):
-    stmt = select(Chat).where(Chat.id == chat_id)
-    chat = session.exec(stmt).one()
+    owner_id: UUID,
+) -> bool:
+    """
+    Soft-deletes a chat of a user.
+
+    Only the chat row is touched, so this is instant whatever the length of
+    the chat: reads skip deleted chats and their messages are removed later,
+    in batches, by the chat purger.
+
+    Args:
+        session (AsyncSession): Database session.
+        chat_id (UUID): The chat to delete.
+        owner_id (UUID): The user the chat must belong to.
+
+    Returns:
+        bool: Whether a chat was deleted, False if it does not exist, is
+            already deleted or belongs to another user.
+    """
+    stmt = (
+        update(Chat)
+        .where(
+            col(Chat.id) == chat_id,
+            col(Chat.owner_id) == owner_id,
+            col(Chat.is_deleted) == false(),
+        )
+        .values(
+            is_deleted=True,
+            deleted_at=datetime.now(timezone.utc),
+            status="deleted",
+        )
+        .returning(col(Chat.id))
+    )
+    deleted = (await session.exec(stmt)).first() is not None
+    await session.commit()
 
-    session.delete(chat)
-    session.commit()
+    if deleted:
+        await chat_cache.invalidate_cached_turns(chat_id)
+    return deleted
 
 
-def get_messages_from_chat(
+async def get_deleted_chat_ids(
+    *, session: AsyncSession, limit: int
+) -> list[UUID]:
+    stmt = (
+        select(Chat.id)
+        .where(col(Chat.is_deleted) == true())
+        .order_by(asc(Chat.deleted_at))
+        .limit(limit)
+    )
+    return list((await session.exec(stmt)).all())
+
+
+async def purge_deleted_chat(
+    *, session: AsyncSession, chat_id: UUID, batch_size: int
+) -> int:
+    """
+    Removes one batch of the messages of a soft-deleted chat, and the chat
+    itself once no message is left.
+
+    Each call is its own short transaction locking at most `batch_size`
+    message rows, found through the (chat_id, sequence) index.
+
+    Args:
+        session (AsyncSession): Database session.
+        chat_id (UUID): A soft-deleted chat.
+        batch_size (int): Maximum number of messages to delete.
+
+    Returns:
+        int: The number of deleted messages, 0 once the chat row is gone.
+    """
+    batch = (
+        select(Message.id)
+        .where(col(Message.chat_id) == chat_id)
+        .order_by(asc(Message.sequence))
+        .limit(batch_size)
+    )
+    stmt = delete(Message).where(col(Message.id).in_(batch.scalar_subquery()))
+    deleted = (await session.exec(stmt)).rowcount  # type: ignore
+    if not deleted:
+        await session.exec(
+            delete(Chat).where(
+                col(Chat.id) == chat_id, col(Chat.is_deleted) == true()
+            )
+        )
+    await session.commit()
+    return deleted
+
+
+async def is_chat_owned_by(
+    *, session: AsyncSession, chat_id: UUID, owner_id: UUID
+) -> bool:
+    stmt = select(Chat.id).where(
+        Chat.id == chat_id,
+        Chat.owner_id == owner_id,
+        col(Chat.is_deleted) == false(),
+    )
+    return (await session.exec(stmt)).first() is not None
+
+
+async def get_message_page_from_chat(
     *,
-    session: Session,
+    session: AsyncSession,
     chat_id: UUID,
-):
+    owner_id: UUID,
+    before: int | None = None,
+    after: int | None = None,
+    limit: int = 50,
+) -> tuple[list[dict[str, Any]], bool] | None:
+    """
+    Fetches one page of a chat history, newest message first.
+
+    Walks the (chat_id, sequence) index from the given position, so the cost
+    of a page does not depend on the length of the chat. The ownership check
+    is part of the same query; only an empty page needs a second statement,
+    to tell an empty chat from a chat of someone else.
+
+    Rows are returned as dicts shaped like `MessageInfo`, without validating
+    them, to be rendered by `FastJSONResponse`.
+
+    Args:
+        session (AsyncSession): Database session.
+        chat_id (UUID): The chat to read.
+        owner_id (UUID): The user the chat must belong to.
+        before (int | None): Only return messages older than this sequence.
+        after (int | None): Only return messages newer than this sequence,
+            the ones closest to it first.
+        limit (int): Maximum number of messages in the page.
+
+    Returns:
+        tuple[list[dict[str, Any]], bool] | None: The page, newest first, and
+            whether more messages exist further in the walking direction.
+            None if the chat does not exist, is deleted or belongs to another
+            user.
+    """
+    # the columns in the field order of MessageInfo, which keys the dicts
+    stmt = (
+        select(
+            Message.role,
+            Message.content,
+            Message.sequence,
+            Message.created_at,
+        )
+        .join(Chat, col(Chat.id) == col(Message.chat_id))
+        .where(
+            col(Message.chat_id) == chat_id,
+            col(Chat.owner_id) == owner_id,
+            col(Chat.is_deleted) == false(),
+        )
+    )
+    if before is not None:
+        stmt = stmt.where(col(Message.sequence) < before)
+    if after is not None:
+        stmt = stmt.where(col(Message.sequence) > after)
+        stmt = stmt.order_by(asc(Message.sequence))
+    else:
+        stmt = stmt.order_by(desc(Message.sequence))
+    # one extra row tells whether there is a next page
+    db_messages = list((await session.exec(stmt.limit(limit + 1))).all())
+
+    if not db_messages and not await is_chat_owned_by(
+        session=session, chat_id=chat_id, owner_id=owner_id
+    ):
+        return None
+
+    has_more = len(db_messages) > limit
+    db_messages = db_messages[:limit]
+    if after is not None:
+        db_messages.reverse()
+
+    messages = [message._asdict() for message in db_messages]
+    return messages, has_more
+
+
+async def select_recent_messages(
+    *,
+    session: AsyncSession,
+    chat_id: UUID,
+    last_sequence: int | None = None,
+) -> list[MessageInfo]:
+    """
+    Reads the most recent turns of a chat from Postgres, oldest first, when
+    the chat cache missed.
+
+    Replies still being generated are left out, so a partial reply is never
+    prompted with nor cached; it is appended once it is finished.
+
+    Args:
+        session (AsyncSession): Database session.
+        chat_id (UUID): The chat to read.
+        last_sequence (int | None): Sequence of the newest turn to include.
+
+    Returns:
+        list[MessageInfo]: Up to CHAT_CACHE_TURNS turns.
+    """
     stmt = (
         select(
             Message.sequence,
@@ -65,103 +259,314 @@ def get_messages_from_chat(
             Message.content,
             Message.created_at,
         )
-        .filter_by(chat_id=chat_id)
-        .order_by(
-            asc(Message.sequence),
-            asc(Message.created_at),
+        .where(
+            col(Message.chat_id) == chat_id,
+            col(Message.status) != MessageStatus.STREAMING.value,
         )
+        .order_by(desc(Message.sequence))
+        .limit(settings.CHAT_CACHE_TURNS)
     )
-    db_messages = session.exec(stmt).all()
+    if last_sequence is not None:
+        stmt = stmt.where(col(Message.sequence) <= last_sequence)
+    db_messages = (await session.exec(stmt)).all()
+
+    return [
+        MessageInfo.model_validate(message) for message in reversed(db_messages)
+    ]
+
 
-    messages = [MessageInfo.model_validate(message) for message in db_messages]
-    return messages
+@dataclass
+class ChatTurn:
+    # the stored user message
+    message: MessageInfo
+    # the empty `streaming` reply, filled in by `StreamedReplyWriter`
+    reply_id: UUID
+    # the turns to prompt with, oldest first, ending with `message`
+    history: list[MessageInfo]
+    # whether the chat had no message before this turn
+    is_first: bool
 
 
-def get_last_message_from_chat(
+async def start_chat_turn(
     *,
-    session: Session,
+    session: AsyncSession,
     chat_id: UUID,
-):
-    statement = (
-        select(Message)
-        .filter_by(chat_id=chat_id)
-        .order_by(desc(Message.sequence), desc(Message.created_at))
-        .limit(1)
+    owner_id: UUID,
+    role: str,
+    content: str,
+) -> ChatTurn | None:
+    """
+    Stores a user message and the placeholder of its reply in one transaction.
+
+    1. One UPDATE of the chat, guarded by `owner_id`, checks ownership,
+       allocates both sequences and bumps the counters, RETURNING the result.
+    2. One INSERT stores the user message and the `streaming` reply.
+    3. The history comes from the chat cache; only on a miss a SELECT in the
+       same transaction reads it.
+
+    So a turn costs two or three statements and a single commit.
+
+    Args:
+        session (AsyncSession): Database session.
+        chat_id (UUID): The chat to write to.
+        owner_id (UUID): The user the chat must belong to.
+        role (str): Role of the user message.
+        content (str): Content of the user message.
+
+    Returns:
+        ChatTurn | None: The stored turn, or None if the chat does not exist,
+            is deleted or belongs to another user.
+    """
+    created_at = datetime.now(timezone.utc)
+    stmt = (
+        update(Chat)
+        .where(
+            col(Chat.id) == chat_id,
+            col(Chat.owner_id) == owner_id,
+            col(Chat.is_deleted) == false(),
+        )
+        .values(
+            next_sequence=col(Chat.next_sequence) + 2,
+            message_count=col(Chat.message_count) + 2,
+            last_message_at=created_at,
+        )
+        .returning(col(Chat.next_sequence))
+    )
+    next_sequence: int | None = (await session.exec(stmt)).scalar_one_or_none()
+    if next_sequence is None:
+        await session.rollback()
+        return None
+
+    db_message = Message(
+        chat_id=chat_id,
+        role=role,
+        content=content,
+        sequence=next_sequence - 2,
+        created_at=created_at,
     )
-    latest_message = session.exec(statement).first()
+    db_reply = Message(
+        chat_id=chat_id,
+        role="assistant",
+        content="",
+        sequence=next_sequence - 1,
+        status=MessageStatus.STREAMING.value,
+    )
+    session.add_all([db_message, db_reply])
+    message = MessageInfo.model_validate(db_message)
 
-    return latest_message
+    # the cache is current when it ends right before this turn
+    cached = await chat_cache.get_cached_turns(
+        chat_id, last_sequence=message.sequence - 1
+    )
+    if cached is not None:
+        history = [*cached, message]
+    else:
+        history = await select_recent_messages(
+            session=session, chat_id=chat_id, last_sequence=message.sequence
+        )
+    await session.commit()
+
+    if cached is not None:
+        await chat_cache.append_cached_turn(chat_id, message)
+    else:
+        await chat_cache.fill_cached_turns(chat_id, history)
+    return ChatTurn(
+        message=message,
+        reply_id=db_reply.id,
+        history=history[-settings.CHAT_CACHE_TURNS :],
+        is_first=message.sequence == 0,
+    )
 
 
-def add_message_to_chat(*, session: Session, new_message: MessageCreate):
-    latest_message = get_last_message_from_chat(
-        session=session, chat_id=new_message.chat_id
+async def append_streamed_content(
+    *,
+    session: AsyncSession,
+    message_id: UUID,
+    content: str,
+    first_token_at: datetime | None = None,
+) -> None:
+    """
+    Checkpoints generated content by appending it to a streaming message.
+
+    The concatenation happens in Postgres (`content || :content`), so each
+    checkpoint only sends the new part of the reply.
+    """
+    values: dict = {"content": col(Message.content) + content}
+    if first_token_at:
+        values["first_token_at"] = first_token_at
+    stmt = update(Message).where(col(Message.id) == message_id).values(values)
+    await session.exec(stmt)
+    await session.commit()
+
+
+async def finish_streamed_message(
+    *,
+    session: AsyncSession,
+    message_id: UUID,
+    content: str,
+    status: MessageStatus,
+    first_token_at: datetime | None = None,
+) -> MessageInfo:
+    """
+    Appends the remaining content to a streaming message and closes it.
+
+    Args:
+        session (AsyncSession): Database session.
+        message_id (UUID): The streaming message.
+        content (str): Content generated since the last checkpoint.
+        status (MessageStatus): COMPLETED, CANCELLED or FAILED.
+        first_token_at (datetime | None): When the first chunk arrived, if
+            it was not checkpointed yet.
+
+    Returns:
+        MessageInfo: The finished message, also written through to the cache.
+    """
+    values: dict = {
+        "content": col(Message.content) + content,
+        "status": status.value,
+        "finished_at": datetime.now(timezone.utc),
+    }
+    if first_token_at:
+        values["first_token_at"] = first_token_at
+    stmt = (
+        update(Message)
+        .where(col(Message.id) == message_id)
+        .values(values)
+        .returning(
+            col(Message.chat_id),
+            col(Message.sequence),
+            col(Message.role),
+            col(Message.content),
+            col(Message.created_at),
+        )
     )
-    if latest_message:
-        new_message.sequence = latest_message.sequence + 1
+    db_message = (await session.exec(stmt)).one()
+    await session.commit()
 
-    db_message = Message.model_validate(new_message)
+    message = MessageInfo.model_validate(db_message)
+    await chat_cache.append_cached_turn(db_message.chat_id, message)
+    return message
 
-    session.add(db_message)
-    session.commit()
 
-
-def get_chats_by_user_id(
+async def get_chats_by_user_id(
     *,
-    session: Session,
+    session: AsyncSession,
     user_id: UUID,
-):
+    before: tuple[datetime, UUID] | None = None,
+    limit: int = 50,
+) -> tuple[list[dict[str, Any]], bool]:
+    """
+    Fetches one page of the chats of a user, most recently active first.
+
+    The page walks the (owner_id, updated_at, id) index from the given
+    position, and the preview of the newest message of every chat comes from
+    a LATERAL subquery on the (chat_id, sequence) index, all in one query.
+    Replies still being generated are not previewed.
+    Chats are returned as dicts shaped like `ChatInfoItem`, for
+    `FastJSONResponse`.
+
+    Args:
+        session (AsyncSession): Database session.
+        user_id (UUID): The owner of the chats.
+        before (tuple[datetime, UUID] | None): `updated_at` and `id` of the
+            last chat of the previous page.
+        limit (int): Maximum number of chats in the page.
+
+    Returns:
+        tuple[list[dict[str, Any]], bool]: The page and whether more chats
+            exist.
+    """
+    last_message = (
+        select(
+            col(Message.role).label("role"),
+            func.left(
+                col(Message.content), settings.CHAT_LIST_PREVIEW_CHARS
+            ).label("preview"),
+        )
+        .where(
+            col(Message.chat_id) == col(Chat.id),
+            # an empty reply in progress would hide the message it answers
+            col(Message.status) != MessageStatus.STREAMING.value,
+        )
+        .order_by(desc(Message.sequence))
+        .limit(1)
+        .lateral("last_message")
+    )
     stmt = (
         select(
             Chat.id,
             Chat.title,
             Chat.updated_at,
             Chat.created_at,
+            Chat.message_count,
+            Chat.last_message_at,
+            last_message.c.role,
+            last_message.c.preview,
         )
-        .where(Chat.owner_id == user_id)
-        .order_by(desc(Chat.created_at))
+        .outerjoin(last_message, true())
+        .where(Chat.owner_id == user_id, col(Chat.is_deleted) == false())
+        .order_by(desc(Chat.updated_at), desc(Chat.id))
+        .limit(limit + 1)
     )
-    db_chats = session.exec(stmt).all()
+    if before is not None:
+        stmt = stmt.where(
+            tuple_(col(Chat.updated_at), col(Chat.id)) < tuple_(*before)
+        )
+    # one extra row tells whether there is a next page
+    db_chats = (await session.exec(stmt)).all()
 
+    # the keys in the field order of ChatInfoItem
     chat_infos = [
-        ChatInfoItem(
-            id=db_chat[0],
-            owner_id=user_id,
-            title=db_chat[1],
-            updated_at=db_chat[2],
-            created_at=db_chat[3],
-        )
-        for db_chat in db_chats
+        {
+            "id": db_chat[0],
+            "owner_id": user_id,
+            "title": db_chat[1],
+            "updated_at": db_chat[2],
+            "created_at": db_chat[3],
+            "message_count": db_chat[4],
+            "last_message_at": db_chat[5],
+            "last_message_role": db_chat[6],
+            "last_message_preview": db_chat[7],
+        }
+        for db_chat in db_chats[:limit]
     ]
 
-    return chat_infos
+    return chat_infos, len(db_chats) > limit
 
 
-def get_chat_by_chat_id(
+async def update_chat_title_by_chat_id(
     *,
-    session: Session,
+    session: AsyncSession,
     chat_id: UUID,
-):
-    stmt = select(Chat).where(Chat.id == chat_id)
-    db_chat = session.exec(stmt).one()
-
-    return db_chat
-
-
-def update_chat_title_by_chat_id(
-    *, session: Session, chat_id: UUID, new_title: str
-):
-    stmt = select(Chat).where(Chat.id == chat_id)
-    db_chat = session.exec(stmt).one()
-    db_chat.title = new_title
-    session.add(db_chat)
-    session.commit()
-    session.refresh(db_chat)
-    return db_chat
-
-
-def count_chat_messages(*, session: Session, chat_id: UUID):
-    stmt = select(Message.id).where(Message.chat_id == chat_id)
-    db_messages = session.exec(stmt).all()
+    new_title: str,
+    owner_id: UUID | None = None,
+) -> TitleUpdateItem | None:
+    """
+    Renames a chat with a single UPDATE ... RETURNING.
+
+    Args:
+        session (AsyncSession): Database session.
+        chat_id (UUID): The chat to rename.
+        new_title (str): The new title.
+        owner_id (UUID | None): When given, the user the chat must belong to.
+
+    Returns:
+        TitleUpdateItem | None: The renamed chat, or None if the chat does not
+            exist, is deleted or belongs to another user.
+    """
+    stmt = update(Chat).where(
+        col(Chat.id) == chat_id, col(Chat.is_deleted) == false()
+    )
+    if owner_id is not None:
+        stmt = stmt.where(col(Chat.owner_id) == owner_id)
+    stmt = stmt.values(title=new_title).returning(
+        col(Chat.id), col(Chat.title), col(Chat.updated_at)
+    )
+    db_chat = (await session.exec(stmt)).first()
+    await session.commit()
 
-    return len(db_messages) if db_messages else 0
+    if db_chat is None:
+        return None
+    return TitleUpdateItem(
+        id=db_chat[0], title=db_chat[1], updated_at=db_chat[2]
+    )
@@ -0,0 +1,228 @@
+import asyncio
+import uuid
+from collections.abc import AsyncIterator
+from uuid import UUID
+
+from app.core.config import settings
+from app.db.redis_client import r
+from app.models.db_models.chat import MessageInfo
+from app.services.reply_writer import StreamedReplyWriter
+from app.utils.logger import logger
+from app.utils.model import generate_model_response_stream
+
+# a consumer on another worker blocks this long on XREAD, below
+# REDIS_SOCKET_TIMEOUT so the read does not time out the connection
+GENERATION_READ_BLOCK_MS = 2000
+
+
+def get_generation_stream_key(generation_id: str) -> str:
+    return f"gen:{generation_id}"
+
+
+def get_generation_meta_key(generation_id: str) -> str:
+    return f"gen:{generation_id}:meta"
+
+
+class LocalGeneration:
+    """
+    A generation running in this process, so local consumers are woken up
+    on every new event instead of blocking a Redis connection on XREAD.
+    """
+
+    def __init__(self):
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+local_generations: dict[str, LocalGeneration] = {}
+# strong references to the producing tasks, cancelled on shutdown
+generation_tasks: set[asyncio.Task] = set()
+
+
+async def start_generation(
+    *,
+    owner_id: UUID,
+    chat_id: UUID,
+    messages: list[MessageInfo],
+    reply_writer: StreamedReplyWriter,
+    title_task: asyncio.Task | None = None,
+) -> str:
+    """
+    Starts generating a reply in the background, detached from the request.
+
+    Every event of the generation is appended to the Redis Stream
+    `gen:{id}` with the ID `0-{n}`, `n` counting from 1, so any number of
+    consumers can follow it with `stream_generation` and a reconnecting
+    client replays what it missed instead of generating the reply again.
+
+    Args:
+        owner_id (UUID): The user allowed to read the generation.
+        chat_id (UUID): The chat the reply belongs to.
+        messages (list[MessageInfo]): The turns to prompt the model with.
+        reply_writer (StreamedReplyWriter): The writer storing the reply.
+        title_task (asyncio.Task | None): Title generation whose result is
+            published as a `title` event.
+
+    Returns:
+        str: The generation ID.
+    """
+    generation_id = uuid.uuid4().hex
+    meta_key = get_generation_meta_key(generation_id)
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.hset(
+            meta_key,
+            mapping={
+                "owner_id": str(owner_id),
+                "chat_id": str(chat_id),
+                "message_id": str(reply_writer.message_id),
+            },
+        )
+        pipe.expire(meta_key, settings.GENERATION_STREAM_TTL)
+        await pipe.execute()
+    except Exception as e:
+        # the reply is still generated and stored, only not resumable
+        logger.error(f"Failed to register generation {generation_id}:\n{e}")
+
+    local_generations[generation_id] = LocalGeneration()
+    task = asyncio.create_task(
+        produce_generation(
+            generation_id=generation_id,
+            messages=messages,
+            reply_writer=reply_writer,
+            title_task=title_task,
+        )
+    )
+    generation_tasks.add(task)
+    task.add_done_callback(generation_tasks.discard)
+    return generation_id
+
+
+async def produce_generation(
+    *,
+    generation_id: str,
+    messages: list[MessageInfo],
+    reply_writer: StreamedReplyWriter,
+    title_task: asyncio.Task | None,
+) -> None:
+    local = local_generations[generation_id]
+    stream_key = get_generation_stream_key(generation_id)
+    meta_key = get_generation_meta_key(generation_id)
+    event_id = 0
+
+    async def publish(event: str, data: str) -> bool:
+        nonlocal event_id
+        event_id += 1
+        try:
+            pipe = r.pipeline(transaction=False)
+            pipe.xadd(
+                stream_key, {"event": event, "data": data}, id=f"0-{event_id}"
+            )
+            pipe.expire(stream_key, settings.GENERATION_STREAM_TTL)
+            pipe.expire(meta_key, settings.GENERATION_STREAM_TTL)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish generation {generation_id}:\n{e}")
+            return False
+        finally:
+            local.notify()
+
+    pending_title = title_task
+    try:
+        async with reply_writer as writer:
+            async for chunk in generate_model_response_stream(messages):
+                if pending_title and pending_title.done():
+                    if title := pending_title.result():
+                        await publish("title", title)
+                    pending_title = None
+                await writer.write(chunk)
+                await publish("message", chunk)
+
+        if pending_title and (title := await pending_title):
+            await publish("title", title)
+    except Exception as e:
+        logger.error(f"Generation {generation_id} failed:\n{e}")
+        await publish("error", "Failed to generate the reply")
+    finally:
+        if not await publish("done", reply_writer.status.value):
+            # without `done`, consumers on other workers stop once the
+            # generation is gone instead of polling until it expires
+            try:
+                await r.delete(meta_key)
+            except Exception as e:
+                logger.error(f"Failed to end generation {generation_id}:\n{e}")
+        local_generations.pop(generation_id, None)
+
+
+async def get_generation_owner(generation_id: str) -> str | None:
+    """Returns the owner of a generation, or None once it expired."""
+    return await r.hget(get_generation_meta_key(generation_id), "owner_id")  # type: ignore
+
+
+async def stream_generation(
+    generation_id: str, last_event_id: int = 0
+) -> AsyncIterator[dict]:
+    """
+    Follows a generation as server-sent events, from after `last_event_id`.
+
+    Events already in the stream are replayed first, then the live tail is
+    followed until the `done` event. Consumers in the process generating
+    the reply wait for a local notification, others block on XREAD.
+
+    Args:
+        generation_id (str): The generation to follow.
+        last_event_id (int): The `Last-Event-ID` of a reconnecting client,
+            0 to read the generation from its start.
+
+    Yields:
+        dict: Events for `EventSourceResponse`, each with its `id`.
+    """
+    stream_key = get_generation_stream_key(generation_id)
+    ran_locally = False
+    while True:
+        local = local_generations.get(generation_id)
+        changed = local.changed if local else None
+        ran_locally = ran_locally or local is not None
+        if ran_locally:
+            entries = await r.xrange(stream_key, min=f"0-{last_event_id + 1}")
+        else:
+            response = await r.xread(
+                {stream_key: f"0-{last_event_id}"},
+                block=GENERATION_READ_BLOCK_MS,
+            )
+            entries = response[0][1] if response else []
+
+        for entry_id, fields in entries:
+            last_event_id = int(entry_id.split("-")[1])
+            if fields["event"] == "done":
+                return
+            if fields["event"] == "message":
+                yield {"id": str(last_event_id), "data": fields["data"]}
+            else:
+                yield {
+                    "id": str(last_event_id),
+                    "event": fields["event"],
+                    "data": fields["data"],
+                }
+
+        if entries:
+            continue
+        if changed:
+            await changed.wait()
+        elif ran_locally:
+            # finished in this process, but its `done` event was not stored
+            return
+        elif not await r.exists(get_generation_meta_key(generation_id)):
+            # expired, or its producer died before finishing
+            return
+
+
+async def cancel_generations() -> None:
+    """Cancels the generations of this process, their replies are kept."""
+    for task in generation_tasks:
+        task.cancel()
+    await asyncio.gather(*generation_tasks, return_exceptions=True)
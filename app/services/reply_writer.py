@@ -0,0 +1,121 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from uuid import UUID
+
+import anyio
+
+from app.core.config import settings
+from app.db.postgres_client import async_session_maker
+from app.models.db_models.chat import MessageInfo, MessageStatus
+from app.services import chat_service
+from app.utils.logger import logger
+
+
+class StreamedReplyWriter:
+    """
+    Persists a streamed assistant reply while it is being generated.
+
+    The reply is an empty `streaming` message, stored along with the user
+    message by `chat_service.start_chat_turn`. Chunks are buffered in a list
+    and appended to the row once CHAT_STREAM_FLUSH_CHARS characters are
+    pending or CHAT_STREAM_FLUSH_INTERVAL seconds passed since the last
+    checkpoint. Leaving the writer stores the rest and marks the message
+    completed, cancelled (the client went away) or failed (generation
+    raised), with its timing.
+
+    The writer uses its own session: the one of the request cannot be relied
+    on once the response streams, and the session only holds a connection
+    while a checkpoint is written.
+
+    Usage:
+        async with StreamedReplyWriter(chat_turn.reply_id) as writer:
+            async for chunk in stream:
+                await writer.write(chunk)
+                yield chunk
+    """
+
+    def __init__(self, message_id: UUID):
+        self.message_id = message_id
+        # the finished message and its status, once the writer was left
+        self.message: MessageInfo | None = None
+        self.status = MessageStatus.STREAMING
+        self._session = async_session_maker()
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._flushed_at = time.monotonic()
+        self._first_token_at: datetime | None = None
+        self._first_token_saved = False
+
+    async def __aenter__(self) -> "StreamedReplyWriter":
+        return self
+
+    async def write(self, chunk: str) -> None:
+        if self._first_token_at is None:
+            self._first_token_at = datetime.now(timezone.utc)
+        self._pending.append(chunk)
+        self._pending_chars += len(chunk)
+        if (
+            self._pending_chars >= settings.CHAT_STREAM_FLUSH_CHARS
+            or time.monotonic() - self._flushed_at
+            >= settings.CHAT_STREAM_FLUSH_INTERVAL
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Checkpoints the buffered chunks to the message row.
+
+        A failed checkpoint is logged and kept buffered for the next one, the
+        stream itself goes on.
+        """
+        if not self._pending:
+            return
+        content = "".join(self._pending)
+        self._pending = [content]
+        self._pending_chars = 0
+        self._flushed_at = time.monotonic()
+        try:
+            await chat_service.append_streamed_content(
+                session=self._session,
+                message_id=self.message_id,
+                content=content,
+                first_token_at=None
+                if self._first_token_saved
+                else self._first_token_at,
+            )
+        except Exception as e:
+            logger.error(f"Failed to checkpoint reply {self.message_id}:\n{e}")
+            await self._session.rollback()
+            return
+        self._pending.clear()
+        # stored with the first checkpoint, never updated afterwards
+        self._first_token_saved = True
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.status = MessageStatus.COMPLETED
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            self.status = MessageStatus.CANCELLED
+        else:
+            self.status = MessageStatus.FAILED
+
+        # the request may be cancelled, the reply is stored regardless
+        with anyio.CancelScope(shield=True):
+            try:
+                self.message = await chat_service.finish_streamed_message(
+                    session=self._session,
+                    message_id=self.message_id,
+                    content="".join(self._pending),
+                    status=self.status,
+                    first_token_at=None
+                    if self._first_token_saved
+                    else self._first_token_at,
+                )
+            except Exception as e:
+                logger.error(
+                    f"Failed to finish reply {self.message_id} as "
+                    f"{self.status.value}:\n{e}"
+                )
+            finally:
+                await self._session.close()
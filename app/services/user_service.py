@@ -1,68 +1,87 @@
 from uuid import UUID
 
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db.main import Session
+from app.db import user_cache
 from app.models.db_models.tables import User
-from app.models.db_models.user import UserCreate, UserUpdate
-from app.utils import security
-from app.utils.security import verify_password
+from app.models.db_models.user import UserCreate, UserInfo, UserUpdate
+from app.utils.security import password_hasher
 
 
-def create_new_user(*, session: Session, new_user_info: UserCreate):
+async def create_new_user(*, session: AsyncSession, new_user_info: UserCreate):
     new_user = User.model_validate(new_user_info)
 
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user)
 
 
-def get_user_by_username(*, session: Session, username: str) -> User:
+async def get_user_by_username(*, session: AsyncSession, username: str) -> User:
     statements = select(User).where(User.username == username)
-    select_user = session.exec(statements).one()
+    select_user = (await session.exec(statements)).one()
 
     return select_user
 
 
-def get_user_by_id(*, session: Session, user_id: UUID) -> User:
+async def get_user_by_id(*, session: AsyncSession, user_id: UUID) -> User:
     statements = select(User).where(User.id == user_id)
-    select_user = session.exec(statements).one()
+    select_user = (await session.exec(statements)).one()
 
     return select_user
 
 
-def get_user_by_email(*, session: Session, email: str) -> User | None:
+async def get_user_info_by_id(
+    *, session: AsyncSession, user_id: UUID
+) -> UserInfo:
+    cached_user = await user_cache.get_cached_user(user_id)
+    if cached_user:
+        return cached_user
+
+    statements = select(User.id, User.username, User.email, User.status).where(
+        User.id == user_id
+    )
+    user = UserInfo.model_validate((await session.exec(statements)).one())
+    await user_cache.cache_user(user)
+
+    return user
+
+
+async def get_user_by_email(
+    *, session: AsyncSession, email: str
+) -> User | None:
     statements = select(User).where(User.email == email)
-    select_user = session.exec(statements).first()
+    select_user = (await session.exec(statements)).first()
 
     return select_user
 
 
-def reset_user_password(
+async def reset_user_password(
     *,
-    session: Session,
+    session: AsyncSession,
     user_id: UUID,
     new_password: str,
 ) -> User | None:
-    user = get_user_by_id(session=session, user_id=user_id)
+    user = await get_user_by_id(session=session, user_id=user_id)
     if not user:
         return None
 
-    user.password_hash = security.get_password_hash(new_password)
+    user.password_hash = await password_hasher.hash(new_password)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    await user_cache.invalidate_user(user_id)
 
     return user
 
 
-def update_user_info(
+async def update_user_info(
     *,
-    session: Session,
+    session: AsyncSession,
     user_id: UUID,
     new_user_info: UserUpdate,
 ) -> User | None:
-    user = get_user_by_id(session=session, user_id=user_id)
+    user = await get_user_by_id(session=session, user_id=user_id)
     if not user:
         return None
 
@@ -70,30 +89,39 @@ def update_user_info(
     extra_data = {}
     if "password" in user_data:
         password = user_data["password"]
-        hashed_password = security.get_password_hash(password)
+        hashed_password = await password_hasher.hash(password)
         extra_data["password_hash"] = hashed_password
     user.sqlmodel_update(user_data, update=extra_data)
 
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    await user_cache.invalidate_user(user_id)
 
     return user
 
 
-def authenticate_user(
+async def authenticate_user(
     *,
-    session: Session,
+    session: AsyncSession,
     username: str,
     password: str,
 ) -> User | None:
-    user = get_user_by_username(session=session, username=username)
+    user = await get_user_by_username(session=session, username=username)
     if not user:
         return None
 
-    if not verify_password(
-        password=password, hashed_password=user.password_hash
-    ):
+    is_valid, new_password_hash = await password_hasher.verify_and_update(
+        password, user.password_hash
+    )
+    if not is_valid:
         return None
 
+    # transparently upgrade hashes made with a previous bcrypt cost
+    if new_password_hash:
+        user.password_hash = new_password_hash
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
     return user
@@ -0,0 +1,41 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.utils import security
+from app.utils.security import Captcha
+
+pytestmark = pytest.mark.anyio
+
+CONCURRENT_ATTEMPTS = 50
+
+
+@pytest.fixture
+def captcha_redis(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(security, "r", fake)
+    return fake
+
+
+async def test_captcha_is_used_only_once(captcha_redis):
+    captcha = Captcha()
+    await captcha_redis.setex(captcha.id, 60, captcha.code)
+
+    results = await asyncio.gather(
+        *[
+            Captcha.verify_captcha(captcha.id, captcha.code)
+            for _ in range(CONCURRENT_ATTEMPTS)
+        ]
+    )
+
+    assert results.count(True) == 1
+    assert await captcha_redis.exists(captcha.id) == 0
+
+
+async def test_wrong_code_consumes_the_captcha(captcha_redis):
+    captcha = Captcha()
+    await captcha_redis.setex(captcha.id, 60, captcha.code)
+
+    assert not await Captcha.verify_captcha(captcha.id, captcha.code + "x")
+    assert not await Captcha.verify_captcha(captcha.id, captcha.code)
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from app.utils.captcha_pool import CaptchaPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(CaptchaPool, "render", staticmethod(object))
+    pool = CaptchaPool(size=5, low_water=2)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def wait_for_size(pool: CaptchaPool, size: int) -> None:
+    deadline = time.monotonic() + 5
+    while pool.qsize() != size:
+        assert time.monotonic() < deadline, f"pool stuck at {pool.qsize()}"
+        time.sleep(0.01)
+
+
+def test_pool_refills_only_below_low_water(pool):
+    wait_for_size(pool, 5)
+
+    pool.pop()
+    pool.pop()
+    pool.pop()
+    time.sleep(0.1)
+    assert pool.qsize() == 2
+
+    pool.pop()
+    wait_for_size(pool, 5)
+
+
+def test_stop_wakes_the_worker(pool):
+    wait_for_size(pool, 5)
+    thread = pool._thread
+
+    pool.stop()
+
+    assert not thread.is_alive()
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from app.db import chat_cache
+from app.models.db_models.chat import MessageInfo
+
+pytestmark = pytest.mark.anyio
+
+
+def make_turn(sequence: int, content: str = "") -> MessageInfo:
+    return MessageInfo(
+        role="user" if sequence % 2 == 0 else "assistant",
+        content=content or f"turn {sequence}",
+        sequence=sequence,
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+async def test_append_extends_a_current_cache(redis):
+    chat_id = uuid4()
+    await chat_cache.fill_cached_turns(chat_id, [make_turn(0), make_turn(1)])
+
+    await chat_cache.append_cached_turn(chat_id, make_turn(2))
+
+    turns = await chat_cache.get_cached_turns(chat_id, last_sequence=2)
+    assert [turn.sequence for turn in turns] == [0, 1, 2]
+
+
+async def test_append_skips_a_cold_chat(redis):
+    chat_id = uuid4()
+
+    await chat_cache.append_cached_turn(chat_id, make_turn(3))
+
+    assert await chat_cache.get_cached_turns(chat_id) is None
+
+
+async def test_reply_finishing_after_a_refill_drops_the_cache(redis):
+    chat_id = uuid4()
+    # turn B refilled the cache while the reply 11 of turn A was streaming
+    await chat_cache.fill_cached_turns(
+        chat_id, [make_turn(9), make_turn(10), make_turn(12)]
+    )
+
+    # A finishes, then the reply of B
+    await chat_cache.append_cached_turn(chat_id, make_turn(11, "complete"))
+    await chat_cache.append_cached_turn(chat_id, make_turn(13))
+
+    assert await chat_cache.get_cached_turns(chat_id, last_sequence=13) is None
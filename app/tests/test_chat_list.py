@@ -0,0 +1,40 @@
+import pytest
+
+from app.models.db_models.chat import MessageStatus
+from app.services import chat_service
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_chat_preview(session_maker, chat) -> tuple[str, str]:
+    async with session_maker() as session:
+        chats, _ = await chat_service.get_chats_by_user_id(
+            session=session, user_id=chat.owner_id
+        )
+    return chats[0]["last_message_role"], chats[0]["last_message_preview"]
+
+
+async def test_streaming_reply_is_not_previewed(session_maker, redis, chat):
+    async with session_maker() as session:
+        turn = await chat_service.start_chat_turn(
+            session=session,
+            chat_id=chat.id,
+            owner_id=chat.owner_id,
+            role="user",
+            content="Hi",
+        )
+
+    assert await get_chat_preview(session_maker, chat) == ("user", "Hi")
+
+    async with session_maker() as session:
+        await chat_service.finish_streamed_message(
+            session=session,
+            message_id=turn.reply_id,
+            content="Hello",
+            status=MessageStatus.COMPLETED,
+        )
+
+    assert await get_chat_preview(session_maker, chat) == (
+        "assistant",
+        "Hello",
+    )
@@ -0,0 +1,57 @@
+import contextlib
+
+import fakeredis
+import pytest
+
+from app.services import chat_purger, chat_service
+from app.services.chat_purger import CHAT_PURGE_LOCK_KEY
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def purger_redis(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(chat_purger, "r", fake)
+    # no Postgres is reached, the chats to purge come from the tests
+    monkeypatch.setattr(
+        chat_purger, "async_session_maker", contextlib.nullcontext
+    )
+    return fake
+
+
+async def test_purge_releases_its_lock(purger_redis, monkeypatch):
+    async def get_deleted_chat_ids(session, limit):
+        assert await purger_redis.get(CHAT_PURGE_LOCK_KEY)
+        return []
+
+    monkeypatch.setattr(
+        chat_service, "get_deleted_chat_ids", get_deleted_chat_ids
+    )
+
+    assert await chat_purger.ChatPurger().purge() == 0
+    assert not await purger_redis.exists(CHAT_PURGE_LOCK_KEY)
+
+
+async def test_purge_keeps_a_lock_taken_by_another_worker(
+    purger_redis, monkeypatch
+):
+    async def get_deleted_chat_ids(session, limit):
+        # the lock expired during the round and another worker took it
+        await purger_redis.set(CHAT_PURGE_LOCK_KEY, "other")
+        return []
+
+    monkeypatch.setattr(
+        chat_service, "get_deleted_chat_ids", get_deleted_chat_ids
+    )
+
+    await chat_purger.ChatPurger().purge()
+
+    assert await purger_redis.get(CHAT_PURGE_LOCK_KEY) == "other"
+
+
+async def test_purge_skips_while_locked(purger_redis):
+    await purger_redis.set(CHAT_PURGE_LOCK_KEY, "other")
+
+    assert await chat_purger.ChatPurger().purge() == 0
+    assert await purger_redis.get(CHAT_PURGE_LOCK_KEY) == "other"
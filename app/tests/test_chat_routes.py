@@ -0,0 +1,154 @@
+from collections.abc import Callable
+from uuid import UUID
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.routes.v1 import chat as chat_routes
+from app.core.config import settings
+from app.db.main import get_async_db_session, get_current_active_user
+from app.models.db_models.user import UserInfo
+from app.services import generation_stream, reply_writer
+from app.tests.conftest import TEST_POSTGRESQL_URI
+
+pytestmark = pytest.mark.anyio
+
+
+async def fake_model_stream(messages):
+    for chunk in ["Hello", " there"]:
+        yield chunk
+
+
+async def fake_chat_title(user_query: str) -> str:
+    return "A title"
+
+
+def as_user(user_id: UUID) -> Callable[[], UserInfo]:
+    return lambda: UserInfo(
+        id=user_id, username="user", email="user@example.com", status=""
+    )
+
+
+@pytest.fixture
+async def app(pg_engine, session_maker, redis, chat, monkeypatch):
+    """
+    The chat routes for the owner of `chat`, whose request sessions are the
+    only ones on `pg_engine`; replies and titles are stored through a second
+    engine.
+    """
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(generation_stream, "r", redis)
+    monkeypatch.setattr(
+        generation_stream, "generate_model_response_stream", fake_model_stream
+    )
+    monkeypatch.setattr(chat_routes, "generate_chat_title", fake_chat_title)
+
+    background_engine = create_async_engine(
+        TEST_POSTGRESQL_URI, poolclass=NullPool
+    )
+    background_session_maker = async_sessionmaker(
+        bind=background_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    monkeypatch.setattr(
+        reply_writer, "async_session_maker", background_session_maker
+    )
+    monkeypatch.setattr(
+        chat_routes, "async_session_maker", background_session_maker
+    )
+
+    async def get_test_session():
+        async with session_maker() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    app.dependency_overrides[get_async_db_session] = get_test_session
+    app.dependency_overrides[get_current_active_user] = as_user(chat.owner_id)
+    yield app
+    await background_engine.dispose()
+
+
+@pytest.fixture
+async def client(app):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def statements(pg_engine) -> list[str]:
+    executed: list[str] = []
+
+    def count_statement(conn, cursor, statement, *args) -> None:
+        executed.append(statement.split(None, 1)[0].upper())
+
+    event.listen(
+        pg_engine.sync_engine, "before_cursor_execute", count_statement
+    )
+    yield executed
+    event.remove(
+        pg_engine.sync_engine, "before_cursor_execute", count_statement
+    )
+
+
+async def test_add_message_statements(client, chat, statements):
+    body = {"chat_id": str(chat.id), "role": "user", "content": "Hi"}
+
+    # the chat cache is cold for the first turn
+    statements.clear()
+    response = await client.post("/chat/messages", json=body)
+    assert response.status_code == 200
+    assert statements == ["UPDATE", "INSERT", "SELECT"]
+
+    # the reply of the first turn was written through to the cache
+    statements.clear()
+    response = await client.post("/chat/messages", json=body)
+    assert response.status_code == 200
+    assert statements == ["UPDATE", "INSERT"]
+
+
+async def test_update_title_statements(client, chat, statements):
+    response = await client.post(
+        "/chat/title", json={"chat_id": str(chat.id), "new_title": "Renamed"}
+    )
+
+    assert response.status_code == 200
+    assert statements == ["UPDATE"]
+
+
+async def test_message_page_statements(client, chat, statements):
+    await client.post(
+        "/chat/messages",
+        json={"chat_id": str(chat.id), "role": "user", "content": "Hi"},
+    )
+
+    statements.clear()
+    response = await client.get("/chat/messages", params={"chat_id": chat.id})
+
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 2
+    assert statements == ["SELECT"]
+
+
+async def test_generation_of_another_user_is_not_found(app, client, chat):
+    response = await client.post(
+        "/chat/messages",
+        json={"chat_id": str(chat.id), "role": "user", "content": "Hi"},
+    )
+    generation_id = response.headers["X-Generation-Id"]
+
+    response = await client.get(f"/chat/generations/{generation_id}")
+    assert response.status_code == 200
+    assert "Hello" in response.text
+
+    app.dependency_overrides[get_current_active_user] = as_user(chat.id)
+    response = await client.get(f"/chat/generations/{generation_id}")
+    assert response.status_code == 404
+    response = await client.get(f"/chat/generations/{'0' * 32}")
+    assert response.status_code == 404
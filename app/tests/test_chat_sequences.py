@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from sqlmodel import select
+
+from app.models.db_models.tables import Chat, Message
+from app.services import chat_service
+
+pytestmark = pytest.mark.anyio
+
+CONCURRENT_TURNS = 50
+
+
+async def test_concurrent_turns_get_unique_sequences(
+    session_maker, redis, chat
+):
+    async def add_turn(i: int) -> chat_service.ChatTurn | None:
+        async with session_maker() as session:
+            return await chat_service.start_chat_turn(
+                session=session,
+                chat_id=chat.id,
+                owner_id=chat.owner_id,
+                role="user",
+                content=f"message {i}",
+            )
+
+    turns = await asyncio.gather(
+        *[add_turn(i) for i in range(CONCURRENT_TURNS)]
+    )
+
+    # every turn takes two sequences: its message and the reply placeholder
+    assert sorted(turn.message.sequence for turn in turns) == list(
+        range(0, CONCURRENT_TURNS * 2, 2)
+    )
+    assert sum(turn.is_first for turn in turns) == 1
+
+    async with session_maker() as session:
+        sequences = (
+            await session.exec(
+                select(Message.sequence)
+                .where(Message.chat_id == chat.id)
+                .order_by(Message.sequence)
+            )
+        ).all()
+        db_chat = (
+            await session.exec(select(Chat).where(Chat.id == chat.id))
+        ).one()
+    assert list(sequences) == list(range(CONCURRENT_TURNS * 2))
+    assert db_chat.message_count == CONCURRENT_TURNS * 2
+    assert db_chat.next_sequence == CONCURRENT_TURNS * 2
+
+
+async def test_turn_in_chat_of_another_user_is_refused(
+    session_maker, redis, chat
+):
+    async with session_maker() as session:
+        turn = await chat_service.start_chat_turn(
+            session=session,
+            chat_id=chat.id,
+            owner_id=chat.id,
+            role="user",
+            content="not mine",
+        )
+        count = (
+            await session.exec(
+                select(Chat.message_count).where(Chat.id == chat.id)
+            )
+        ).one()
+    assert turn is None
+    assert count == 0
@@ -0,0 +1,97 @@
+import asyncio
+import uuid
+
+import fakeredis
+import pytest
+
+from app.models.db_models.chat import MessageStatus
+from app.services import generation_stream
+from app.services.generation_stream import (
+    get_generation_meta_key,
+    start_generation,
+    stream_generation,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingPipelineRedis(fakeredis.FakeAsyncRedis):
+    """Fails the pipelines publishing events once `failing` is set."""
+
+    failing = False
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        if self.failing:
+
+            async def execute(*args, **kwargs):
+                raise ConnectionError("Redis is unavailable")
+
+            pipe.execute = execute
+        return pipe
+
+
+class FakeReplyWriter:
+    message_id = uuid.uuid4()
+    status = MessageStatus.COMPLETED
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def write(self, chunk: str) -> None:
+        pass
+
+
+@pytest.fixture
+def generation_redis(monkeypatch):
+    fake = FailingPipelineRedis(decode_responses=True)
+    monkeypatch.setattr(generation_stream, "r", fake)
+
+    async def fake_model_stream(messages):
+        for chunk in ["Hello", " there"]:
+            yield chunk
+        # the `done` event is lost
+        fake.failing = True
+
+    monkeypatch.setattr(
+        generation_stream, "generate_model_response_stream", fake_model_stream
+    )
+    return fake
+
+
+async def follow(generation_id: str) -> list[str]:
+    async with asyncio.timeout(5):
+        return [
+            event["data"] async for event in stream_generation(generation_id)
+        ]
+
+
+async def test_local_consumer_ends_without_done(generation_redis):
+    generation_id = await start_generation(
+        owner_id=uuid.uuid4(),
+        chat_id=uuid.uuid4(),
+        messages=[],
+        reply_writer=FakeReplyWriter(),
+    )
+
+    assert await follow(generation_id) == ["Hello", " there"]
+    assert not await generation_redis.exists(
+        get_generation_meta_key(generation_id)
+    )
+
+
+async def test_remote_consumer_ends_without_done(generation_redis):
+    generation_id = await start_generation(
+        owner_id=uuid.uuid4(),
+        chat_id=uuid.uuid4(),
+        messages=[],
+        reply_writer=FakeReplyWriter(),
+    )
+    await asyncio.gather(*generation_stream.generation_tasks)
+
+    # the generation ran in another process, as far as this consumer knows
+    assert generation_id not in generation_stream.local_generations
+    assert await follow(generation_id) == ["Hello", " there"]
@@ -0,0 +1,44 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.api.routes.v1 import internal
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client():
+    app = FastAPI()
+    app.include_router(internal.router)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as test_client:
+        yield test_client
+
+
+async def test_stats_are_disabled_by_default(client, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_STATS_TOKEN", "")
+
+    response = await client.get(
+        "/internal/stats", headers={"X-Internal-Token": ""}
+    )
+
+    assert response.status_code == 404
+
+
+async def test_stats_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_STATS_TOKEN", "secret")
+
+    assert (await client.get("/internal/stats")).status_code == 404
+    response = await client.get(
+        "/internal/stats", headers={"X-Internal-Token": "wrong"}
+    )
+    assert response.status_code == 404
+
+    response = await client.get(
+        "/internal/stats", headers={"X-Internal-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert "postgres_pool" in response.json()["data"]
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import fakeredis
+import pytest
+
+from app.utils import mail_queue
+from app.utils.mail_queue import (
+    MAIL_CONSUMERS_KEY,
+    MAIL_QUEUE_KEY,
+    MailWorker,
+    QueuedMail,
+    get_mail_consumer_key,
+    get_mail_processing_key,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class BlockingFakeRedis(fakeredis.FakeAsyncRedis):
+    async def blmove(self, *args, **kwargs):
+        # fakeredis answers at once instead of blocking for the timeout
+        item = await super().blmove(*args, **kwargs)
+        if item is None:
+            await asyncio.sleep(0.01)
+        return item
+
+
+@pytest.fixture
+def mail_redis(monkeypatch):
+    fake = BlockingFakeRedis(decode_responses=True)
+    monkeypatch.setattr(mail_queue, "r", fake)
+    return fake
+
+
+async def wait_for_status(mail_id: str, status: str) -> None:
+    async with asyncio.timeout(5):
+        while (await mail_queue.get_mail_status(mail_id)).get("status") != (
+            status
+        ):
+            await asyncio.sleep(0.01)
+
+
+async def test_sent_mail_is_acknowledged(mail_redis, monkeypatch):
+    monkeypatch.setattr(mail_queue, "send_mail", lambda smtp, mail: object())
+    monkeypatch.setattr(mail_queue, "close_smtp_connection", lambda smtp: None)
+    consumer = asyncio.create_task(MailWorker(1)._consume("test"))
+
+    mail_id = await mail_queue.enqueue_mail(
+        email_to="a@example.com", message=""
+    )
+    await wait_for_status(mail_id, "sent")
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+
+    assert await mail_redis.llen(MAIL_QUEUE_KEY) == 0
+    assert await mail_redis.llen(get_mail_processing_key("test")) == 0
+
+
+async def test_mails_of_dead_consumers_are_queued_again(mail_redis):
+    mails = [
+        QueuedMail(id=str(i), to="a@example.com", message="").model_dump_json()
+        for i in range(3)
+    ]
+    # as BLMOVE left them, the newest first
+    await mail_redis.lpush(get_mail_processing_key("dead"), *mails)
+    await mail_redis.lpush(get_mail_processing_key("alive"), "in progress")
+    await mail_redis.set(get_mail_consumer_key("alive"), "1")
+    await mail_redis.sadd(MAIL_CONSUMERS_KEY, "dead", "alive")
+
+    await MailWorker(1)._requeue_dead_consumers()
+
+    # the oldest is taken first, from the right
+    assert await mail_redis.lrange(MAIL_QUEUE_KEY, 0, -1) == mails[::-1]
+    assert await mail_redis.smembers(MAIL_CONSUMERS_KEY) == {"alive"}
+    assert await mail_redis.llen(get_mail_processing_key("alive")) == 1
+
+
+async def test_stopping_waits_for_the_send(mail_redis, monkeypatch):
+    sending = threading.Event()
+    release = threading.Event()
+    events: list[str] = []
+
+    def send_mail(smtp, mail):
+        sending.set()
+        release.wait(5)
+        events.append("sent")
+        return object()
+
+    def close_smtp_connection(smtp):
+        assert threading.current_thread() is not threading.main_thread()
+        events.append("closed")
+
+    monkeypatch.setattr(mail_queue, "send_mail", send_mail)
+    monkeypatch.setattr(
+        mail_queue, "close_smtp_connection", close_smtp_connection
+    )
+    consumer = asyncio.create_task(MailWorker(1)._consume("test"))
+    mail_id = await mail_queue.enqueue_mail(
+        email_to="a@example.com", message=""
+    )
+    await asyncio.to_thread(sending.wait, 5)
+
+    consumer.cancel()
+    await asyncio.sleep(0.05)
+    assert not consumer.done()
+    release.set()
+    with pytest.raises(asyncio.CancelledError):
+        await consumer
+
+    assert events == ["sent", "closed"]
+    assert (await mail_queue.get_mail_status(mail_id))["status"] == "sent"
+    assert await mail_redis.llen(get_mail_processing_key("test")) == 0
@@ -2,6 +2,7 @@ import emails
 
 from app.core.config import settings
 from app.utils.logger import logger
+from app.utils.mail_queue import enqueue_mail
 from app.utils.security import CaptchaInfo
 
 
@@ -16,6 +17,48 @@ def get_email_template(code: str) -> str:
     """
 
 
+def build_email_captcha_message(
+    *,
+    email_to: str,
+    captcha: CaptchaInfo,
+) -> emails.Message:
+    return emails.Message(
+        subject="User Registration",
+        html=get_email_template(captcha.code),
+        mail_from=(settings.EMAIL_FROM_NAME, settings.SMTP_USERNAME),
+        mail_to=email_to,
+    )
+
+
+async def enqueue_email_captcha(
+    *,
+    email_to: str,
+    captcha: CaptchaInfo,
+) -> str:
+    """
+    Queues an email containing a CAPTCHA code for the mail worker.
+
+    Unlike `send_email_captcha`, no SMTP connection is made on the calling
+    request; the mail worker delivers the message over its persistent
+    connections and retries it on failure.
+
+    Args:
+        email_to (str): The email address of the recipient.
+        captcha (CaptchaInfo): An object containing the CAPTCHA code to be sent.
+
+    Returns:
+        str: The mail ID, to look up the delivery status with `get_mail_status`.
+
+    Raises:
+        AssertionError: If email functionality is not enabled in the settings.
+    """
+    assert settings.EMAIL_ENABLED, (
+        "no provided configuration for email variables"
+    )
+    message = build_email_captcha_message(email_to=email_to, captcha=captcha)
+    return await enqueue_mail(email_to=email_to, message=message.as_string())
+
+
 def send_email_captcha(
     *,
     email_to: str,
@@ -41,13 +84,7 @@ def send_email_captcha(
     assert settings.EMAIL_ENABLED, (
         "no provided configuration for email variables"
     )
-    email_subject = "User Registration"
-    html_template = get_email_template(captcha.code)
-    message = emails.Message(
-        subject=email_subject,
-        html=html_template,
-        mail_from=(settings.EMAIL_FROM_NAME, settings.SMTP_USERNAME),
-    )
+    message = build_email_captcha_message(email_to=email_to, captcha=captcha)
     smtp_options = {
         "host": settings.SMTP_HOST,
         "port": settings.SMTP_PORT,
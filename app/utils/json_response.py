@@ -0,0 +1,100 @@
+from typing import Any
+from uuid import UUID
+
+import orjson
+from fastapi import Response
+
+# datetimes in UTC end with "Z", as pydantic writes them
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def serialize_json_default(value: Any) -> Any:
+    # orjson only knows uuid.UUID itself, asyncpg returns a subclass of it
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dump_json(content: Any) -> bytes:
+    """Serializes plain dicts, lists, UUIDs and datetimes with orjson."""
+    return orjson.dumps(
+        content, default=serialize_json_default, option=JSON_OPTIONS
+    )
+
+
+class FastJSONResponse(Response):
+    """
+    A JSON response rendered by orjson, for routes returning large lists.
+
+    A route returning it skips the validation and serialization of its
+    `response_model`, so the content must already have the shape of the
+    model: dicts with the same keys in the same order. The bytes are then
+    identical to those of the default path (compact separators, UTF-8
+    without escaping, "Z" for UTC datetimes).
+
+    Usage:
+        @router.get("/path", response_model=ResponseBase[list[Item]])
+        async def route() -> FastJSONResponse:
+            return FastJSONResponse(build_response_body(rows))
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+def build_response_body(data: Any, next_cursor: str | None = None) -> dict:
+    """Builds the body of a `ResponseBase`, with its keys in the same order."""
+    return {"code": "0", "msg": "ok", "data": data, "next_cursor": next_cursor}
+
+
+if __name__ == "__main__":
+    # compare both paths on a 10k message chat:
+    #   python -m app.utils.json_response
+    import json
+    import time
+    from datetime import datetime, timedelta, timezone
+
+    from pydantic import TypeAdapter
+
+    from app.models.db_models.chat import MessageInfo
+    from app.models.response import ResponseBase
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f'消息 {i} "quoted"\n\ttab   é ' * (1 + i % 8),
+            "sequence": i,
+            "created_at": start + timedelta(seconds=i, microseconds=i % 3),
+        }
+        for i in range(10_000)
+    ]
+    response_adapter = TypeAdapter(ResponseBase[list[MessageInfo]])
+
+    def default_path() -> bytes:
+        # what FastAPI does with the return value and its response_model
+        content = ResponseBase[list[MessageInfo]](
+            data=[MessageInfo.model_validate(row) for row in rows]
+        ).model_dump()
+        value = response_adapter.validate_python(content)
+        return json.dumps(
+            response_adapter.dump_python(value, mode="json"),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(build_response_body(rows)).body
+
+    assert default_path() == fast_path(), "the two paths differ"
+    for name, path in [("default", default_path), ("orjson", fast_path)]:
+        rounds = 20
+        began = time.perf_counter()
+        for _ in range(rounds):
+            path()
+        elapsed = (time.perf_counter() - began) / rounds
+        print(f"{name:>8}: {elapsed * 1000:8.2f} ms per 10k messages")
@@ -0,0 +1,382 @@
+import asyncio
+import os
+import smtplib
+import socket
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from email import message_from_string
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.db.redis_client import r
+from app.utils.logger import logger
+
+MAIL_QUEUE_KEY = "mail:queue"
+# mails waiting for their next attempt, scored by the time it is due
+MAIL_RETRY_KEY = "mail:retry"
+# seconds a consumer blocks on the queue, below REDIS_SOCKET_TIMEOUT
+MAIL_POLL_INTERVAL = 1
+# consumers of every process, each holding its mail in a processing list
+# until the status is written, and alive while its heartbeat key exists
+MAIL_CONSUMERS_KEY = "mail:consumers"
+MAIL_HEARTBEAT_INTERVAL = 10
+# above the longest SMTP exchange, during which no heartbeat is sent
+MAIL_CONSUMER_TTL = 120
+
+
+@dataclass
+class MailStats:
+    queued: int = 0
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    connections_opened: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+mail_stats = MailStats()
+
+
+class QueuedMail(BaseModel):
+    id: str
+    to: str
+    message: str
+    attempts: int = 0
+
+
+def get_mail_status_key(mail_id: str) -> str:
+    return f"mail:{mail_id}:status"
+
+
+def get_mail_processing_key(consumer: str) -> str:
+    return f"mail:processing:{consumer}"
+
+
+def get_mail_consumer_key(consumer: str) -> str:
+    return f"mail:consumer:{consumer}"
+
+
+async def set_mail_status(mail_id: str, status: str, **fields) -> None:
+    key = get_mail_status_key(mail_id)
+    pipe = r.pipeline(transaction=True)
+    pipe.hset(
+        key,
+        mapping={
+            "status": status,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        },
+    )
+    pipe.expire(key, settings.MAIL_STATUS_TTL)
+    await pipe.execute()
+
+
+async def get_mail_status(mail_id: str) -> dict[str, str]:
+    """
+    Reads the delivery status of a queued mail.
+
+    Returns:
+        dict[str, str]: `status` is one of "queued", "retrying", "sent" or
+            "failed", along with `attempts`, `updated_at` and the last `error`.
+            Empty once MAIL_STATUS_TTL has passed.
+    """
+    return await r.hgetall(get_mail_status_key(mail_id))  # type: ignore
+
+
+async def enqueue_mail(*, email_to: str, message: str) -> str:
+    """
+    Queues a mail for delivery by the mail worker and returns immediately.
+
+    Args:
+        email_to (str): The recipient address.
+        message (str): The complete MIME message.
+
+    Returns:
+        str: The mail ID, to look up its delivery status.
+    """
+    mail = QueuedMail(id=uuid.uuid4().hex, to=email_to, message=message)
+    await set_mail_status(mail.id, "queued", attempts=0)
+    await r.lpush(MAIL_QUEUE_KEY, mail.model_dump_json())  # type: ignore
+    mail_stats.queued += 1
+    return mail.id
+
+
+def open_smtp_connection() -> smtplib.SMTP:
+    """Connects and authenticates to SMTP_HOST, on the calling thread."""
+    if settings.SMTP_SSL:
+        smtp = smtplib.SMTP_SSL(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            timeout=settings.SMTP_TIMEOUT,
+        )
+    else:
+        smtp = smtplib.SMTP(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            timeout=settings.SMTP_TIMEOUT,
+        )
+    try:
+        if settings.SMTP_TLS and not settings.SMTP_SSL:
+            smtp.starttls()
+        # local stand-ins such as aiosmtpd accept mail without authentication
+        if settings.SMTP_PASSWORD:
+            smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+    except Exception:
+        close_smtp_connection(smtp)
+        raise
+    mail_stats.connections_opened += 1
+    return smtp
+
+
+def close_smtp_connection(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+def send_mail(smtp: smtplib.SMTP | None, mail: QueuedMail) -> smtplib.SMTP:
+    """
+    Sends one mail over a reused SMTP connection, on the calling thread.
+
+    Servers drop idle connections, so a connection that turns out to be closed
+    is replaced once without counting as a failed attempt.
+
+    Args:
+        smtp (smtplib.SMTP | None): The connection of the consumer, if any.
+        mail (QueuedMail): The mail to send.
+
+    Returns:
+        smtplib.SMTP: The connection to reuse for the next mail.
+
+    Raises:
+        smtplib.SMTPException | OSError: If the mail could not be sent; the
+            connection is closed in that case.
+    """
+    if smtp is not None:
+        try:
+            smtp.noop()
+        except (smtplib.SMTPServerDisconnected, OSError):
+            smtp.close()
+            smtp = None
+    if smtp is None:
+        smtp = open_smtp_connection()
+    try:
+        smtp.send_message(
+            message_from_string(mail.message),
+            from_addr=settings.SMTP_USERNAME,
+            to_addrs=[mail.to],
+        )
+    except Exception:
+        close_smtp_connection(smtp)
+        raise
+    return smtp
+
+
+class MailWorker:
+    """
+    Delivers queued mails over a small pool of persistent SMTP connections.
+
+    Each of the `connections` consumers owns one SMTP connection, opened on
+    the first mail and kept authenticated across mails until it has been idle
+    for MAIL_SMTP_IDLE_TIMEOUT seconds. Failed mails are retried with
+    exponential backoff through a sorted set, so a slow retry does not hold a
+    connection, and are marked "failed" after MAIL_MAX_ATTEMPTS.
+
+    A consumer moves the mail it takes into its own processing list and only
+    removes it there once the outcome is recorded. The processing lists of
+    consumers whose heartbeat expired, after a crash of their process, are
+    moved back to the queue, so mails are delivered at least once.
+
+    Attributes:
+        connections (int): Number of consumers, and so of SMTP connections.
+    """
+
+    def __init__(self, connections: int):
+        self.connections = connections
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        process = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [
+            asyncio.create_task(
+                self._consume(f"{process}:{i}"), name=f"mail-worker-{i}"
+            )
+            for i in range(self.connections)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _consume(self, consumer: str) -> None:
+        processing_key = get_mail_processing_key(consumer)
+        smtp: smtplib.SMTP | None = None
+        last_used = time.monotonic()
+        next_heartbeat = 0.0
+        try:
+            while True:
+                try:
+                    if time.monotonic() >= next_heartbeat:
+                        await self._heartbeat(consumer)
+                        next_heartbeat = (
+                            time.monotonic() + MAIL_HEARTBEAT_INTERVAL
+                        )
+                    await self._promote_due_retries()
+                    item = await r.blmove(  # type: ignore
+                        MAIL_QUEUE_KEY,
+                        processing_key,
+                        MAIL_POLL_INTERVAL,
+                        src="RIGHT",
+                        dest="LEFT",
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Failed to read the mail queue:\n{e}")
+                    await asyncio.sleep(MAIL_POLL_INTERVAL)
+                    continue
+
+                if item is None:
+                    idle = time.monotonic() - last_used
+                    if smtp and idle > settings.MAIL_SMTP_IDLE_TIMEOUT:
+                        await asyncio.to_thread(close_smtp_connection, smtp)
+                        smtp = None
+                    continue
+
+                processed = asyncio.ensure_future(
+                    self._process(smtp, item, processing_key)
+                )
+                try:
+                    smtp = await asyncio.shield(processed)
+                except asyncio.CancelledError:
+                    # the send runs on a thread and cannot be interrupted, so
+                    # the mail is finished and recorded before stopping, and
+                    # the connection is not closed while still in use
+                    smtp = await processed
+                    raise
+                last_used = time.monotonic()
+        finally:
+            if smtp:
+                await asyncio.to_thread(close_smtp_connection, smtp)
+
+    async def _process(
+        self, smtp: smtplib.SMTP | None, item: str, processing_key: str
+    ) -> smtplib.SMTP | None:
+        mail: QueuedMail | None = None
+        try:
+            mail = QueuedMail.model_validate_json(item)
+        except ValueError as e:
+            logger.error(f"Dropping an invalid queued mail:\n{e}")
+
+        try:
+            if mail:
+                smtp = await self._deliver(smtp, mail)
+            # a crash before this leaves the mail to be queued again
+            await r.lrem(processing_key, 1, item)  # type: ignore
+        except Exception as e:
+            mail_id = mail.id if mail else "(invalid)"
+            logger.error(f"Failed to record mail {mail_id}:\n{e}")
+        return smtp
+
+    async def _deliver(
+        self, smtp: smtplib.SMTP | None, mail: QueuedMail
+    ) -> smtplib.SMTP | None:
+        mail.attempts += 1
+        try:
+            smtp = await asyncio.to_thread(send_mail, smtp, mail)
+        except Exception as e:
+            await self._retry_or_fail(mail, e)
+            return None
+
+        mail_stats.sent += 1
+        await set_mail_status(mail.id, "sent", attempts=mail.attempts)
+        return smtp
+
+    async def _retry_or_fail(self, mail: QueuedMail, error: Exception) -> None:
+        # a rejected recipient will not be accepted on a later attempt either
+        permanent = isinstance(error, smtplib.SMTPRecipientsRefused)
+        if permanent or mail.attempts >= settings.MAIL_MAX_ATTEMPTS:
+            mail_stats.failed += 1
+            logger.error(
+                f"Mail {mail.id} to {mail.to} failed after "
+                f"{mail.attempts} attempts:\n{error}"
+            )
+            await set_mail_status(
+                mail.id, "failed", attempts=mail.attempts, error=str(error)
+            )
+            return
+
+        delay = settings.MAIL_RETRY_BACKOFF * 2 ** (mail.attempts - 1)
+        mail_stats.retried += 1
+        logger.warning(
+            f"Mail {mail.id} to {mail.to} failed, retrying in {delay}s:\n{error}"
+        )
+        await r.zadd(
+            MAIL_RETRY_KEY, {mail.model_dump_json(): time.time() + delay}
+        )
+        await set_mail_status(
+            mail.id, "retrying", attempts=mail.attempts, error=str(error)
+        )
+
+    async def _heartbeat(self, consumer: str) -> None:
+        await r.set(get_mail_consumer_key(consumer), "1", ex=MAIL_CONSUMER_TTL)
+        await r.sadd(MAIL_CONSUMERS_KEY, consumer)  # type: ignore
+        await self._requeue_dead_consumers()
+
+    async def _requeue_dead_consumers(self) -> None:
+        consumers = await r.smembers(MAIL_CONSUMERS_KEY)  # type: ignore
+        for consumer in consumers:
+            if await r.exists(get_mail_consumer_key(consumer)):
+                continue
+            # SREM decides which consumer takes over the mails of a dead one
+            if not await r.srem(MAIL_CONSUMERS_KEY, consumer):  # type: ignore
+                continue
+            processing_key = get_mail_processing_key(consumer)
+            requeued = 0
+            # newest first to the consuming end, so the oldest is next
+            while await r.lmove(  # type: ignore
+                processing_key, MAIL_QUEUE_KEY, src="LEFT", dest="RIGHT"
+            ):
+                requeued += 1
+            if requeued:
+                logger.warning(
+                    f"Queued {requeued} mails of stopped consumer {consumer} "
+                    "again"
+                )
+
+    async def _promote_due_retries(self) -> None:
+        due = await r.zrangebyscore(MAIL_RETRY_KEY, "-inf", time.time())
+        for item in due:
+            # ZREM decides which consumer (of any process) claims the retry
+            if await r.zrem(MAIL_RETRY_KEY, item):
+                await r.lpush(MAIL_QUEUE_KEY, item)  # type: ignore
+
+
+mail_worker = MailWorker(connections=settings.MAIL_SMTP_CONNECTIONS)
+
+
+if __name__ == "__main__":
+    # run the worker on its own, without the API:
+    #   python -m app.utils.mail_queue
+    async def main() -> None:
+        mail_worker.start()
+        logger.success(
+            f"Mail worker started with {mail_worker.connections} connections "
+            f"to {settings.SMTP_HOST}:{settings.SMTP_PORT}"
+        )
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await mail_worker.stop()
+
+    asyncio.run(main())
@@ -1,12 +1,82 @@
-from openai import OpenAI, Stream
+import asyncio
+import hashlib
+import json
+import time
+import unicodedata
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass
+
+import httpx
+from openai import AsyncOpenAI, AsyncStream, DefaultAsyncHttpxClient
 from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 
 from app.core.config import settings
+from app.db.redis_client import r
 from app.models.db_models.chat import MessageInfo
+from app.utils.logger import logger
+
+# created on first use, so importing the app opens no HTTP connection pool
+_model_client: AsyncOpenAI | None = None
+
+
+def get_model_client() -> AsyncOpenAI:
+    """
+    Returns the model client of this worker, with one pooled HTTP client
+    shared by every request.
+    """
+    global _model_client
+    if _model_client is None:
+        model_http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.MODEL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MODEL_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(
+                settings.MODEL_STREAM_TIMEOUT,
+                connect=settings.MODEL_CONNECT_TIMEOUT,
+            ),
+        )
+        _model_client = AsyncOpenAI(
+            api_key=settings.MODEL_API_KEY,
+            base_url=settings.MODEL_BASE_URL,
+            max_retries=settings.MODEL_MAX_RETRIES,
+            http_client=model_http_client,
+        )
+    return _model_client
+
+
+# caps the number of completions in flight towards the provider
+model_in_flight = asyncio.Semaphore(settings.MODEL_MAX_IN_FLIGHT)
+
+MODEL_CACHE_KEY_PREFIX = "llm:cache:"
+# cached keys scored by their last use, to evict the least recently used
+MODEL_CACHE_INDEX_KEY = "llm:cache:index"
+# characters per chunk when a cached answer is replayed as a stream
+MODEL_CACHE_REPLAY_CHUNK = 32
+
+
+@dataclass
+class ModelCacheStats:
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+    # upstream time the hits did not spend, as measured on the cached calls
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
-model_client = OpenAI(
-    api_key=settings.MODEL_API_KEY, base_url=settings.MODEL_BASE_URL
-)
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "saved_seconds": round(self.saved_seconds, 3),
+            "hit_ratio": round(self.hit_ratio, 4),
+        }
+
+
+model_cache_stats = ModelCacheStats()
 
 
 system_prompt = """
@@ -70,7 +140,111 @@ generate_chat_title_system_prompt = """
 """
 
 
-async def generate_model_response_stream(history: list[MessageInfo]):
+def get_model_cache_key(
+    messages: list[dict[str, str]], temperature: float | None = None
+) -> str:
+    """
+    Derives the response cache key of a completion request.
+
+    Message contents are NFKC-normalized and their whitespace collapsed, so
+    prompts differing only in width or spacing share one answer.
+
+    Args:
+        messages (list[dict[str, str]]): The messages, system prompt included.
+        temperature (float | None): The sampling temperature, if set.
+
+    Returns:
+        str: The Redis key of the cached answer.
+    """
+    normalized = [
+        [
+            message["role"],
+            " ".join(unicodedata.normalize("NFKC", message["content"]).split()),
+        ]
+        for message in messages
+    ]
+    payload = json.dumps(
+        [settings.MODEL_NAME, temperature, normalized], ensure_ascii=False
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{MODEL_CACHE_KEY_PREFIX}{digest}"
+
+
+async def get_cached_completion(key: str) -> str | None:
+    """
+    Reads a cached answer and marks it as recently used.
+
+    Returns:
+        str | None: The answer, or None on a miss or when Redis is unavailable.
+    """
+    if not settings.MODEL_CACHE_ENABLED:
+        return None
+    try:
+        cached = await r.get(key)
+        if cached is not None:
+            await r.zadd(MODEL_CACHE_INDEX_KEY, {key: time.time()})
+    except Exception as e:
+        model_cache_stats.errors += 1
+        logger.error(f"Failed to read the model cache:\n{e}")
+        return None
+
+    if cached is None:
+        model_cache_stats.misses += 1
+        return None
+    entry = json.loads(cached)
+    model_cache_stats.hits += 1
+    model_cache_stats.saved_seconds += entry["latency"]
+    return entry["content"]
+
+
+async def cache_completion(key: str, content: str, latency: float) -> None:
+    """
+    Stores an answer for MODEL_CACHE_TTL seconds, then evicts the least
+    recently used answers beyond MODEL_CACHE_MAX_ENTRIES.
+
+    Args:
+        key (str): The key from `get_model_cache_key`.
+        content (str): The complete answer.
+        latency (float): Seconds the upstream call took, reported as saved
+            by every later hit.
+    """
+    if not settings.MODEL_CACHE_ENABLED or not content:
+        return
+    now = time.time()
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.set(
+            key,
+            json.dumps({"content": content, "latency": latency}),
+            ex=settings.MODEL_CACHE_TTL,
+        )
+        pipe.zadd(MODEL_CACHE_INDEX_KEY, {key: now})
+        # index entries of answers that expired on their own
+        pipe.zremrangebyscore(
+            MODEL_CACHE_INDEX_KEY, "-inf", now - settings.MODEL_CACHE_TTL
+        )
+        pipe.zcard(MODEL_CACHE_INDEX_KEY)
+        *_, size = await pipe.execute()
+
+        excess = size - settings.MODEL_CACHE_MAX_ENTRIES
+        if excess > 0:
+            # ZPOPMIN hands every evicted key to exactly one worker
+            evicted = await r.zpopmin(MODEL_CACHE_INDEX_KEY, excess)
+            if evicted:
+                await r.delete(*[evicted_key for evicted_key, _ in evicted])
+    except Exception as e:
+        model_cache_stats.errors += 1
+        logger.error(f"Failed to write the model cache:\n{e}")
+
+
+def is_chat_response_cacheable() -> bool:
+    # answers are only reused when they are deterministic or configured so
+    return settings.MODEL_CHAT_CACHE or settings.MODEL_CHAT_TEMPERATURE == 0
+
+
+async def generate_model_response_stream(
+    history: list[MessageInfo],
+) -> AsyncIterator[str]:
     messages = [{"role": "system", "content": system_prompt}]
 
     messages.extend(
@@ -82,26 +256,81 @@ async def generate_model_response_stream(history: list[MessageInfo]):
             for message in history
         ]
     )
-    response: Stream[ChatCompletionChunk] = (
-        model_client.chat.completions.create(
+
+    cache_key = None
+    if is_chat_response_cacheable():
+        cache_key = get_model_cache_key(
+            messages, temperature=settings.MODEL_CHAT_TEMPERATURE
+        )
+        if (cached := await get_cached_completion(cache_key)) is not None:
+            # replayed in chunks, clients see the same stream of events
+            for start in range(0, len(cached), MODEL_CACHE_REPLAY_CHUNK):
+                yield cached[start : start + MODEL_CACHE_REPLAY_CHUNK]
+            return
+
+    extra_options = {}
+    if settings.MODEL_CHAT_TEMPERATURE is not None:
+        extra_options["temperature"] = settings.MODEL_CHAT_TEMPERATURE
+    parts: list[str] = []
+    started = time.perf_counter()
+    async with model_in_flight:
+        response: AsyncStream[
+            ChatCompletionChunk
+        ] = await get_model_client().chat.completions.create(
             model=settings.MODEL_NAME,
             messages=messages,  # type: ignore
             stream=True,
+            timeout=settings.MODEL_STREAM_TIMEOUT,
+            **extra_options,
+        )
+        # closing the stream releases the connection back to the pool,
+        # also when the client goes away in the middle of the answer
+        async with response:
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                if content := chunk.choices[0].delta.content:
+                    if cache_key:
+                        parts.append(content)
+                    yield content
+
+    # only answers streamed to the end are cached
+    if cache_key:
+        await cache_completion(
+            cache_key, "".join(parts), time.perf_counter() - started
         )
-    )
-    for chunk in response:
-        if content := chunk.choices[0].delta.content:
-            yield content
 
 
 async def generate_chat_title(user_query: str):
-    response = model_client.chat.completions.create(
-        model=settings.MODEL_NAME,
-        messages=[
-            {"role": "system", "content": generate_chat_title_system_prompt},
-            {"role": "user", "content": user_query},
-        ],
-        stream=False,
-    )
+    messages = [
+        {
+            "role": "system",
+            "content": generate_chat_title_system_prompt,
+        },
+        {"role": "user", "content": user_query},
+    ]
+    # first messages repeat a lot ("hello", "你好"), so titles are reused
+    cache_key = get_model_cache_key(messages)
+    if (cached := await get_cached_completion(cache_key)) is not None:
+        return cached
+
+    started = time.perf_counter()
+    async with model_in_flight:
+        response = await get_model_client().chat.completions.create(
+            model=settings.MODEL_NAME,
+            messages=messages,  # type: ignore
+            stream=False,
+            timeout=settings.MODEL_TITLE_TIMEOUT,
+        )
+
+    title = response.choices[0].message.content or ""
+    await cache_completion(cache_key, title, time.perf_counter() - started)
+    return title
+
 
-    return response.choices[0].message.content or ""
+async def close_model_client():
+    """Closes the pooled HTTP connections of the model client, if created."""
+    global _model_client
+    if _model_client is not None:
+        await _model_client.close()
+        _model_client = None
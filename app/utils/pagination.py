@@ -0,0 +1,41 @@
+import base64
+import json
+from typing import Any
+
+
+def encode_cursor(position: dict[str, Any]) -> str:
+    """
+    Encodes a keyset position into an opaque, URL-safe cursor string.
+
+    Args:
+        position (dict[str, Any]): JSON serializable values of the sort keys
+            of the last item on a page.
+
+    Returns:
+        str: The cursor to hand out to clients.
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor received from a client.
+
+    Returns:
+        dict[str, Any]: The keyset position stored in the cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return position
@@ -1,7 +1,11 @@
+import asyncio
 import base64
 import random
+import secrets
 import string
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from typing import Literal
 
@@ -10,9 +14,14 @@ from passlib.context import CryptContext
 from PIL.Image import Image
 from pydantic import BaseModel
 
+from app.core.config import settings
 from app.db.redis_client import r
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 
 def get_password_hash(password: str) -> str:
@@ -42,10 +51,138 @@ def verify_password(password: str, hashed_password: str) -> bool:
     return pwd_context.verify(password, hashed_password)
 
 
+def get_password_hash_rounds(hashed_password: str) -> int | None:
+    """
+    Reads the bcrypt cost factor out of a hash such as `$2b$12$...`.
+
+    Args:
+        hashed_password (str): The stored password hash.
+
+    Returns:
+        int | None: The cost factor, or None if the hash is not bcrypt.
+    """
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many hash/verify calls are already waiting."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop in a bounded thread pool.
+
+    bcrypt releases the GIL while hashing, so the worker threads hash in
+    parallel while the event loop keeps serving other requests. Calls beyond
+    `max_workers + max_queue` in flight are rejected instead of piling up.
+
+    Attributes:
+        max_workers (int): Number of hashing threads.
+        max_queue (int): Number of calls allowed to wait for a free thread.
+        in_flight (int): Calls currently running or waiting.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+
+    async def _run(self, func, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            raise PasswordHasherBusyError("Password hashing queue is full")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hashes a password with the configured cost."""
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verifies a password against a stored hash."""
+        return await self._run(verify_password, password, hashed_password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """
+        Verifies a password and rehashes it when the configured cost changed.
+
+        Args:
+            password (str): The plain text password to verify.
+            hashed_password (str): The stored password hash.
+
+        Returns:
+            tuple[bool, str | None]: Whether the password matches, and a new
+                hash to store when the stored one uses an outdated cost.
+        """
+        if not await self.verify(password, hashed_password):
+            return False, None
+        rounds = get_password_hash_rounds(hashed_password)
+        if rounds == settings.PASSWORD_BCRYPT_ROUNDS:
+            return True, None
+        return True, await self.hash(password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+# building an ImageCaptcha loads its fonts, so a single renderer is shared
+image_captcha = ImageCaptcha()
+image_captcha_lock = threading.Lock()
+
+CaptchaImageFormat = Literal["png", "png8", "webp"]
+
+CAPTCHA_IMAGE_MEDIA_TYPES: dict[CaptchaImageFormat, str] = {
+    "png": "image/png",
+    "png8": "image/png",
+    "webp": "image/webp",
+}
+
+
+def encode_captcha_image(img: Image, image_format: CaptchaImageFormat) -> bytes:
+    """
+    Encodes a rendered captcha image.
+
+    Args:
+        img (Image): The rendered captcha.
+        image_format (CaptchaImageFormat): "png" for a truecolor PNG, "png8" for
+            a 32-color palette PNG, or "webp" for a lossy WebP.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    out_buffer = BytesIO()
+    if image_format == "webp":
+        img.save(out_buffer, format="WEBP", quality=60, method=4)
+    elif image_format == "png8":
+        img.quantize(colors=32).save(out_buffer, format="PNG", optimize=True)
+    else:
+        img.save(out_buffer, format="PNG")
+    return out_buffer.getvalue()
+
+
 class CaptchaInfo(BaseModel):
     id: str
     code: str
     base64: str | None = None
+    images: dict[str, bytes] | None = None
 
 
 class Captcha:
@@ -66,6 +203,7 @@ class Captcha:
         generate_img_base64: Generates a base64-encoded image of the CAPTCHA code.
         get_captcha: Retrieves CAPTCHA information based on the specified type.
         verify_captcha: Verifies if the provided CAPTCHA code matches the stored one.
+        verify_captchas: Verifies several CAPTCHA codes in a single Redis round trip.
     """
 
     def __init__(
@@ -84,32 +222,52 @@ class Captcha:
         chr_all = string.ascii_letters + string.digits
         return "".join(random.choices(population=chr_all, k=self.code_len))
 
+    def generate_img(self) -> Image:
+        """生成验证码图片"""
+        with image_captcha_lock:
+            return image_captcha.generate_image(chars=self.code)
+
     @property
     def generate_img_base64(self) -> str:
         """生成验证码图片base64"""
-        image_captcha = ImageCaptcha()
-        img: Image = image_captcha.generate_image(chars=self.code)
-
-        out_buffer = BytesIO()
-        img.save(out_buffer, format="PNG")
-        byte_data: bytes = out_buffer.getvalue()
+        byte_data: bytes = encode_captcha_image(self.generate_img(), "png")
         base64_str: str = base64.b64encode(byte_data).decode(encoding="utf-8")
         return base64_str
 
-    def get_captcha(self) -> CaptchaInfo:
-        """获取验证码"""
+    def get_captcha(
+        self, image_formats: tuple[CaptchaImageFormat, ...] = ()
+    ) -> CaptchaInfo:
+        """获取验证码, 可同时编码为多种图片格式"""
         if self.type == "image":
-            img_base64 = self.generate_img_base64
+            img = self.generate_img()
+            images = {
+                image_format: encode_captcha_image(img, image_format)
+                for image_format in {"png", *image_formats}
+            }
             return CaptchaInfo(
                 id=self.id,
                 code=self.code,
-                base64=img_base64,
+                base64=base64.b64encode(images["png"]).decode("utf-8"),
+                images=images,
             )
         return CaptchaInfo(id=self.id, code=self.code)
 
     @staticmethod
-    def verify_captcha(captcha_id: str, captcha_code: str) -> bool:
-        """验证验证码"""
-        code = r.get(name=captcha_id)
-        r.delete(captcha_id)
-        return code == captcha_code
+    async def verify_captcha(captcha_id: str, captcha_code: str) -> bool:
+        """验证验证码, GETDEL 原子地取出并删除, 同一验证码只能使用一次"""
+        return (await Captcha.verify_captchas([(captcha_id, captcha_code)]))[0]
+
+    @staticmethod
+    async def verify_captchas(captchas: list[tuple[str, str]]) -> list[bool]:
+        """批量验证验证码, 所有 GETDEL 在一次往返中完成"""
+        pipe = r.pipeline(transaction=False)
+        for captcha_id, _ in captchas:
+            pipe.getdel(captcha_id)
+        stored_codes = await pipe.execute()
+        return [
+            stored_code is not None
+            and secrets.compare_digest(
+                str(stored_code).encode("utf-8"), captcha_code.encode("utf-8")
+            )
+            for stored_code, (_, captcha_code) in zip(stored_codes, captchas)
+        ]